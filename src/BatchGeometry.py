@@ -0,0 +1,115 @@
+import numpy as np
+from typing import List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from Geometry import Gutter, Margin
+import Layout
+
+
+class Placements:
+    """
+    Placements of a collection of layouts, packed into arrays.
+    Each array has one element per placement. Placements are ordered by layout, and within each
+    layout in the same order as the cells are generated by GenerateGeometry.
+    """
+    def __init__(self, Grids: Sequence[Union[Layout.SparseGrid, List[List[Optional[Tuple[int, int]]]]]], IsDoublePage: Sequence[bool]) -> None:
+        LayoutIdxs, Rows, Cols, ColSpans, RowSpans, RowCounts, ColCounts, DoublePages = [], [], [], [], [], [], [], []
+        for LayoutIdx, Grid in enumerate(Grids):
+            Grid = Layout.Compact(Grid)
+            for Row, Col, ColSpan, RowSpan in Grid:
+                LayoutIdxs.append(LayoutIdx)
+                Rows.append(Row)
+                Cols.append(Col)
+                ColSpans.append(ColSpan)
+                RowSpans.append(RowSpan)
+                RowCounts.append(Grid.RowCount)
+                ColCounts.append(Grid.ColCount)
+                DoublePages.append(IsDoublePage[LayoutIdx])
+
+        self.LayoutCount = len(Grids)
+        self.Layout = np.array(LayoutIdxs, dtype=np.intp)
+        self.Row = np.array(Rows, dtype=np.intp)
+        self.Col = np.array(Cols, dtype=np.intp)
+        self.ColSpan = np.array(ColSpans, dtype=np.intp)
+        self.RowSpan = np.array(RowSpans, dtype=np.intp)
+        self.RowCount = np.array(RowCounts, dtype=np.intp)
+        self.ColCount = np.array(ColCounts, dtype=np.intp)
+        self.IsDoublePage = np.array(DoublePages, dtype=bool)
+
+
+class Cells(NamedTuple):
+    """
+    Geometry of cells, as for Geometry.Cell.
+    Each array has one row per parameter set and one column per placement.
+    """
+    X: np.ndarray
+    Y: np.ndarray
+    Width: np.ndarray
+    Height: np.ndarray
+    TopPad: np.ndarray
+    RightPad: np.ndarray
+    BottomPad: np.ndarray
+    LeftPad: np.ndarray
+
+
+def GetCatalogPlacements() -> Tuple[List[str], Placements]:
+    Catalog = Layout.GetCatalog()
+    return [Entry.Uuid for Entry in Catalog], Placements([Entry.Grid for Entry in Catalog], [Entry.IsDoublePage for Entry in Catalog])
+
+
+def GetParameters(Configurations: Sequence[Tuple[Tuple[int, int], Margin, Gutter]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pack (dimensions, margin, gutter) tuples into arrays for GenerateBatchGeometry.
+    """
+    Dimensions = np.array([Configuration[0] for Configuration in Configurations], dtype=np.float64).reshape(-1, 2)
+    Margins = np.array([(Configuration[1].Top, Configuration[1].Right, Configuration[1].Bottom, Configuration[1].Left) for Configuration in Configurations], dtype=np.float64).reshape(-1, 4)
+    Gutters = np.array([(Configuration[2].Vertical, Configuration[2].Horizontal) for Configuration in Configurations], dtype=np.float64).reshape(-1, 2)
+    return Dimensions, Margins, Gutters
+
+
+def GenerateBatchGeometry(Placements: Placements, Dimensions: np.ndarray, Margins: np.ndarray, Gutters: np.ndarray) -> Cells:
+    """
+    Compute the geometry of all placements for many parameter sets at once.
+    Dimensions has shape (K,2) with single page width and height, Margins has shape (K,4) with
+    top, right, bottom and left margins, and Gutters has shape (K,2) with vertical and horizontal
+    gutters. The operations are performed in the same order as in GenerateGeometry, so the
+    results are identical to the scalar path.
+    """
+    Dimensions = np.asarray(Dimensions, dtype=np.float64)
+    Margins = np.asarray(Margins, dtype=np.float64)
+    Gutters = np.asarray(Gutters, dtype=np.float64)
+
+    PageWidth = Dimensions[:, 0:1] * np.where(Placements.IsDoublePage, 2, 1)
+    PageHeight = Dimensions[:, 1:2]
+    Top, Right, Bottom, Left = (Margins[:, Idx:Idx+1] for Idx in range(4))
+    Vertical, Horizontal = Gutters[:, 0:1], Gutters[:, 1:2]
+
+    CellHeight = (PageHeight - Top - Bottom - (Placements.RowCount-1) * Vertical) / Placements.RowCount
+    CellWidth = (PageWidth - Left - Right - (Placements.ColCount-1) * Horizontal) / Placements.ColCount
+
+    Zero = np.zeros(CellWidth.shape)
+    TopPad = np.where(0 < Placements.Row, Zero + Vertical / 2, Zero)
+    RightPad = np.where(Placements.Col + Placements.ColSpan < Placements.ColCount, Zero + Horizontal / 2, Zero)
+    BottomPad = np.where(Placements.Row + Placements.RowSpan < Placements.RowCount, Zero + Vertical / 2, Zero)
+    LeftPad = np.where(0 < Placements.Col, Zero + Horizontal / 2, Zero)
+
+    Width = LeftPad + CellWidth + RightPad + (CellWidth + Horizontal) * (Placements.ColSpan - 1)
+    Height = BottomPad + CellHeight + TopPad + (CellHeight + Vertical) * (Placements.RowSpan - 1)
+
+    # Positions are accumulated track by track, exactly as in GenerateGeometry.
+    X = np.empty(CellWidth.shape)
+    PosX = Zero + Left
+    for ColIdx in range(int(Placements.Col.max(initial=0)) + 1):
+        X = np.where(Placements.Col == ColIdx, PosX, X)
+        if 0 < ColIdx:
+            PosX = PosX + Horizontal / 2
+        PosX = PosX + (CellWidth + Horizontal / 2)
+
+    Y = np.empty(CellHeight.shape)
+    PosY = Zero + (PageHeight - Top)
+    for RowIdx in range(int(Placements.Row.max(initial=0)) + 1):
+        Y = np.where(Placements.Row == RowIdx, PosY, Y)
+        if 0 < RowIdx:
+            PosY = PosY - Vertical / 2
+        PosY = PosY - (CellHeight + Vertical / 2)
+
+    return Cells(X, Y, Width, Height, TopPad, RightPad, BottomPad, LeftPad)
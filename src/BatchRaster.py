@@ -0,0 +1,92 @@
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+
+from BatchGeometry import Cells, Placements
+
+
+# Palette indices of the pixels of thumbnails.
+Background, Fill, Outline, Crosshair = range(4)
+
+CrosshairSize = 3
+
+
+def GetThumbnailRectangles(Placements: Placements, Cells: Cells, PageHeights: np.ndarray, Ratios: np.ndarray) -> np.ndarray:
+    """
+    Scale the cells of the first parameter set down to thumbnail rectangles.
+    PageHeights and Ratios have one element per layout, with the page height and the ratio between
+    page and thumbnail. The result has one row of left, top, right and bottom per placement. The
+    operations are performed in the same order as in generate.GetThumbnailRectangles, so the
+    results are identical.
+    """
+    Height = PageHeights[Placements.Layout].astype(np.float64)
+    Ratio = Ratios[Placements.Layout]
+    X, Y, Width, CellHeight = Cells.X[0], Cells.Y[0], Cells.Width[0], Cells.Height[0]
+    Left = np.trunc(np.trunc(X + Cells.LeftPad[0]) / Ratio)
+    Top = np.trunc(np.trunc(Height - Y + Cells.TopPad[0]) / Ratio)
+    Right = np.trunc(np.trunc(X + Width - Cells.RightPad[0]) / Ratio)
+    Bottom = np.trunc(np.trunc(Height - Y + CellHeight - Cells.BottomPad[0]) / Ratio)
+    return np.stack([Left, Top, Right, Bottom], axis=1).astype(np.intp)
+
+
+def NewPlanes(Sizes: Sequence[Tuple[int, int]]) -> List[np.ndarray]:
+    """
+    Get one plane of palette indices per thumbnail, filled with the background.
+    The planes of thumbnails of the same size are stacked in one array.
+    """
+    Groups: Dict[Tuple[int, int], List[int]] = {}
+    for Idx, Size in enumerate(Sizes):
+        Groups.setdefault(Size, []).append(Idx)
+    Planes: List[np.ndarray] = [np.empty(0)] * len(Sizes)
+    for (Width, Height), Idxs in Groups.items():
+        Stack = np.full((len(Idxs), Height, Width), Background, dtype=np.uint8)
+        for Plane, Idx in zip(Stack, Idxs):
+            Planes[Idx] = Plane
+    return Planes
+
+
+def DrawRectangles(Planes: List[np.ndarray], Layouts: np.ndarray, Rectangles: np.ndarray) -> None:
+    """
+    Draw rectangles with crosshairs on the planes of their layouts, exactly as
+    generate.DrawRectangles draws them with Pillow.
+    The rectangles are drawn one after another, since later rectangles may cover earlier ones, but
+    all bounds are computed for all rectangles at once. Each rectangle is filled with the outline
+    colour, and then its inside with the fill colour.
+    """
+    LayoutIdxs = Layouts.astype(np.intp)
+    Shapes = np.array([Plane.shape for Plane in Planes], dtype=np.intp).reshape(-1, 2)[LayoutIdxs]
+    Heights, Widths = Shapes[:, 0], Shapes[:, 1]
+    Left, Top, Right, Bottom = Rectangles.T
+    HorizontalCenter = ((Right - Left) / 2 + Left).astype(np.intp)
+    VerticalCenter = ((Bottom - Top) / 2 + Top).astype(np.intp)
+    # Slicing clips the pixel ranges at the lower right corner, so they only have to be clipped at
+    # the upper left corner. Crosshairs are drawn where the center is inside the plane.
+    Bounds = np.stack([
+        LayoutIdxs,
+        np.maximum(Top, 0), np.maximum(Bottom + 1, 0), np.maximum(Left, 0), np.maximum(Right + 1, 0),
+        np.maximum(Top + 1, 0), np.maximum(Bottom, 0), np.maximum(Left + 1, 0), np.maximum(Right, 0),
+        np.where((0 <= HorizontalCenter) & (HorizontalCenter < Widths), HorizontalCenter, -1),
+        np.maximum(VerticalCenter - CrosshairSize, 0), np.maximum(VerticalCenter + CrosshairSize + 1, 0),
+        np.where((0 <= VerticalCenter) & (VerticalCenter < Heights), VerticalCenter, -1),
+        np.maximum(HorizontalCenter - CrosshairSize, 0), np.maximum(HorizontalCenter + CrosshairSize + 1, 0),
+        Top == Bottom,
+    ], axis=1)
+    for Idx, (Layout, Top0, Bottom1, Left0, Right1, InnerTop, InnerBottom, InnerLeft, InnerRight, HorizontalCenter, CrosshairTop, CrosshairBottom, VerticalCenter, CrosshairLeft, CrosshairRight, IsFlat) in enumerate(Bounds.tolist()):
+        Plane = Planes[Layout]
+        Plane[Top0:Bottom1, Left0:Right1] = Outline
+        Plane[InnerTop:InnerBottom, InnerLeft:InnerRight] = Fill
+        if IsFlat:
+            DrawFlatSides(Plane, Rectangles[Idx].tolist())
+        if 0 <= HorizontalCenter:
+            Plane[CrosshairTop:CrosshairBottom, HorizontalCenter] = Crosshair
+        if 0 <= VerticalCenter:
+            Plane[VerticalCenter, CrosshairLeft:CrosshairRight] = Crosshair
+
+
+def DrawFlatSides(Plane: np.ndarray, Rectangle: List[int]) -> None:
+    # Pillow draws the sides of a rectangle without height one pixel below it.
+    Left, Top, Right, Bottom = Rectangle
+    Height, Width = Plane.shape
+    if 0 <= Top + 1 < Height:
+        for Col in (Left, Right):
+            if 0 <= Col < Width:
+                Plane[Top + 1, Col] = Outline
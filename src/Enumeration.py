@@ -0,0 +1,164 @@
+import functools
+from typing import Callable, FrozenSet, List, Set, Tuple
+import uuid
+
+from Layout import Entry, SparseGrid
+from Validation import GetRectangleMask
+
+
+# Namespace for the UUIDs of enumerated layouts.
+Namespace = uuid.UUID('a3b6f0f2-1f6e-4d8a-9c43-6b2f3e1d7c55')
+
+Partition = Tuple[Tuple[int, int, int, int], ...]
+
+
+@functools.lru_cache(maxsize=None)
+def GetGuillotinePartitions(Height: int, Width: int, MaxImages: int, MinSpan: int) -> Tuple[FrozenSet[Partition], ...]:
+    """
+    Get all partitions of a Height x Width rectangle that can be made by recursively cutting it in
+    two, with at most MaxImages images spanning at least MinSpan rows and columns each.
+    Element K of the result holds the partitions with K images, as row-major sorted placements of
+    (row, column, width, height) relative to the upper left corner of the rectangle.
+    """
+    MaxImages = min(MaxImages, (Height // MinSpan) * (Width // MinSpan))
+    Partitions: List[Set[Partition]] = [set() for _ in range(MaxImages + 1)]
+    if MaxImages < 1:
+        return tuple(frozenset(Set) for Set in Partitions)
+
+    Partitions[1].add(((0, 0, Width, Height),))
+    if 1 < MaxImages:
+        for Cut in range(MinSpan, Height - MinSpan + 1):
+            Top = GetGuillotinePartitions(Cut, Width, MaxImages - 1, MinSpan)
+            Bottom = GetGuillotinePartitions(Height - Cut, Width, MaxImages - 1, MinSpan)
+            for BottomCount in range(1, len(Bottom)):
+                Shifted = [tuple((Row + Cut, Col, ColSpan, RowSpan) for Row, Col, ColSpan, RowSpan in Part) for Part in Bottom[BottomCount]]
+                for TopCount in range(1, min(len(Top), MaxImages - BottomCount + 1)):
+                    # All placements in the top part come before the bottom part in row-major order.
+                    Partitions[TopCount + BottomCount].update(TopPart + BottomPart for TopPart in Top[TopCount] for BottomPart in Shifted)
+        for Cut in range(MinSpan, Width - MinSpan + 1):
+            Left = GetGuillotinePartitions(Height, Cut, MaxImages - 1, MinSpan)
+            Right = GetGuillotinePartitions(Height, Width - Cut, MaxImages - 1, MinSpan)
+            for RightCount in range(1, len(Right)):
+                Shifted = [tuple((Row, Col + Cut, ColSpan, RowSpan) for Row, Col, ColSpan, RowSpan in Part) for Part in Right[RightCount]]
+                for LeftCount in range(1, min(len(Left), MaxImages - RightCount + 1)):
+                    Partitions[LeftCount + RightCount].update(tuple(sorted(LeftPart + RightPart)) for LeftPart in Left[LeftCount] for RightPart in Shifted)
+    return tuple(frozenset(Set) for Set in Partitions)
+
+
+def GetAllPartitions(Height: int, Width: int, MaxImages: int, MinSpan: int) -> Set[Partition]:
+    """
+    Get all partitions of a Height x Width rectangle, including those that cannot be made by
+    recursively cutting it in two, with at most MaxImages images spanning at least MinSpan rows
+    and columns each.
+    The rectangle is filled cell by cell in row-major order. The first free cell must be the upper
+    left corner of the next image, and completions are memoized by the occupancy bitmap.
+    """
+    Full = (1 << (Height * Width)) - 1
+    FirstCol = sum(1 << (Row * Width) for Row in range(Height))
+    LastCol = FirstCol << (Width - 1)
+    GetMask = functools.lru_cache(maxsize=None)(GetRectangleMask)
+
+    def GetMinImages(Free: int) -> int:
+        # Each convex corner of the free area is the corner of a different image, so the number
+        # of upper left corners, or of any of the other three kinds, is a lower bound.
+        Left = (Free << 1) & ~FirstCol
+        Right = (Free >> 1) & ~LastCol
+        Up = Free << Width
+        Down = Free >> Width
+        return max(
+            bin(Free & ~Left & ~Up).count('1'),
+            bin(Free & ~Right & ~Up).count('1'),
+            bin(Free & ~Left & ~Down).count('1'),
+            bin(Free & ~Right & ~Down).count('1'),
+        )
+
+    @functools.lru_cache(maxsize=None)
+    def Complete(Occupied: int, Remaining: int) -> Tuple[Partition, ...]:
+        if Occupied == Full:
+            return ((),)
+        Free = Full & ~Occupied
+        if Remaining < GetMinImages(Free):
+            return ()
+        Row, Col = divmod((Free & -Free).bit_length() - 1, Width)
+        Completions = []
+        for RowSpan in range(MinSpan, Height - Row + 1):
+            if GetMask(Width, Row, Col, MinSpan, RowSpan) & Occupied:
+                break
+            for ColSpan in range(MinSpan, Width - Col + 1):
+                Mask = GetMask(Width, Row, Col, ColSpan, RowSpan)
+                if Mask & Occupied:
+                    break
+                for Rest in Complete(Occupied | Mask, Remaining - 1):
+                    Completions.append(((Row, Col, ColSpan, RowSpan),) + Rest)
+        return tuple(Completions)
+
+    return set(Complete(0, MaxImages))
+
+
+def GetSymmetries(RowCount: int, ColCount: int) -> List[Callable[[Partition], Partition]]:
+    """
+    Get the mirrorings and rotations mapping a RowCount x ColCount grid onto itself.
+    Rotations by 90 degrees only keep the grid shape when it is square.
+    """
+    def GetSymmetry(Horizontal: bool, Vertical: bool, Transpose: bool) -> Callable[[Partition], Partition]:
+        def Symmetry(Partition: Partition) -> Partition:
+            Transformed = []
+            for Row, Col, ColSpan, RowSpan in Partition:
+                if Horizontal:
+                    Col = ColCount - Col - ColSpan
+                if Vertical:
+                    Row = RowCount - Row - RowSpan
+                if Transpose:
+                    Row, Col, ColSpan, RowSpan = Col, Row, RowSpan, ColSpan
+                Transformed.append((Row, Col, ColSpan, RowSpan))
+            Transformed.sort()
+            return tuple(Transformed)
+        return Symmetry
+
+    Transposes = (False, True) if RowCount == ColCount else (False,)
+    return [GetSymmetry(Horizontal, Vertical, Transpose) for Transpose in Transposes for Vertical in (False, True) for Horizontal in (False, True)]
+
+
+def GetCanonicalForms(Partitions: Set[Partition], Symmetries: List[Callable[[Partition], Partition]]) -> List[Partition]:
+    """
+    Get one representative, the smallest, of each set of partitions that are mirror images or
+    rotations of each other.
+    The mirror images and rotations of a partition are marked as seen, so that the symmetries are
+    only applied once for each set.
+    """
+    Seen: Set[Partition] = set()
+    Canonical = []
+    for Partition in Partitions:
+        if Partition in Seen:
+            continue
+        Orbit = {Symmetry(Partition) for Symmetry in Symmetries}
+        Seen |= Orbit
+        Canonical.append(min(Orbit))
+    return Canonical
+
+
+def GetUuid(RowCount: int, ColCount: int, Partition: Partition, IsDoublePage: bool) -> str:
+    return str(uuid.uuid5(Namespace, repr((RowCount, ColCount, Partition, IsDoublePage))))
+
+
+def EnumerateLayouts(RowCount: int, ColCount: int, MaxImages: int, MinSpan: int = 1, Guillotine: bool = True, IsDoublePage: bool = False) -> List[Entry]:
+    """
+    Enumerate all layouts of a RowCount x ColCount grid with at most MaxImages images, each
+    spanning at least MinSpan rows and columns, and without uncovered cells.
+    With Guillotine, only layouts that can be made by recursively cutting the page in two are
+    enumerated. Layouts that are mirror images or rotations of each other are only included once,
+    in their canonical form. Each layout gets a UUID derived from its canonical form, so the same
+    layout always gets the same UUID. Layouts are ordered by number of images.
+    """
+    if Guillotine:
+        Partitions = set().union(*GetGuillotinePartitions(RowCount, ColCount, MaxImages, MinSpan))
+    else:
+        Partitions = GetAllPartitions(RowCount, ColCount, MaxImages, MinSpan)
+
+    Canonical = GetCanonicalForms(Partitions, GetSymmetries(RowCount, ColCount))
+
+    Entries = []
+    for Partition in sorted(Canonical, key=lambda Partition: (len(Partition), Partition)):
+        Grid = SparseGrid(RowCount, ColCount, Partition)
+        Entries.append(Entry(GetUuid(RowCount, ColCount, Partition, IsDoublePage), Grid, IsDoublePage))
+    return Entries
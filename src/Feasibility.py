@@ -0,0 +1,74 @@
+import numpy as np
+from typing import NamedTuple, Tuple
+
+from BatchGeometry import Placements
+
+
+class Feasibility(NamedTuple):
+    """
+    Extreme image sizes and aspect ratios of each layout for many parameter sets.
+    Each array has one row per parameter set and one column per layout. Image sizes exclude the
+    padding of the cells. Aspect ratios are width over height, and are only meaningful where both
+    are positive.
+    """
+    MinWidth: np.ndarray
+    MinHeight: np.ndarray
+    MinAspect: np.ndarray
+    MaxAspect: np.ndarray
+
+    def IsFeasible(self, MinSize: float = 0) -> np.ndarray:
+        """
+        Get whether all images of each layout are larger than MinSize in both directions.
+        """
+        return (MinSize < self.MinWidth) & (MinSize < self.MinHeight)
+
+
+def GetImageSizes(Placements: Placements, Dimensions: np.ndarray, Margins: np.ndarray, Gutters: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the width and height of all images for many parameter sets at once, with parameters
+    as for BatchGeometry.GenerateBatchGeometry. The arrays have one row per parameter set and one
+    column per placement.
+    An image spanning S of the C columns of a page of width W is (S/C)(W-L-R+G)-G wide, where L
+    and R are the margins and G the horizontal gutter, and likewise for heights, so no geometry
+    has to be generated.
+    """
+    Dimensions = np.asarray(Dimensions, dtype=np.float64)
+    Margins = np.asarray(Margins, dtype=np.float64)
+    Gutters = np.asarray(Gutters, dtype=np.float64)
+
+    PageWidth = Dimensions[:, 0:1] * np.where(Placements.IsDoublePage, 2, 1)
+    PageHeight = Dimensions[:, 1:2]
+    Top, Right, Bottom, Left = (Margins[:, Idx:Idx+1] for Idx in range(4))
+    Vertical, Horizontal = Gutters[:, 0:1], Gutters[:, 1:2]
+
+    Width = Placements.ColSpan / Placements.ColCount * (PageWidth - Left - Right + Horizontal) - Horizontal
+    Height = Placements.RowSpan / Placements.RowCount * (PageHeight - Top - Bottom + Vertical) - Vertical
+    return Width, Height
+
+
+def GetLayoutStarts(Placements: Placements) -> np.ndarray:
+    """
+    Get the index of the first placement of each layout, for reducing placements per layout.
+    """
+    # Placements are ordered by layout, so each layout is a contiguous range of placements.
+    Starts = np.searchsorted(Placements.Layout, np.arange(Placements.LayoutCount))
+    assert np.all(np.diff(np.append(Starts, len(Placements.Layout))) > 0), 'Every layout must have images'
+    return Starts
+
+
+def AnalyzeFeasibility(Placements: Placements, Dimensions: np.ndarray, Margins: np.ndarray, Gutters: np.ndarray) -> Feasibility:
+    """
+    Compute the extreme image sizes and aspect ratios of all layouts for many parameter sets at
+    once, with parameters as for BatchGeometry.GenerateBatchGeometry.
+    """
+    Width, Height = GetImageSizes(Placements, Dimensions, Margins, Gutters)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        Aspect = Width / Height
+
+    Starts = GetLayoutStarts(Placements)
+    return Feasibility(
+        np.minimum.reduceat(Width, Starts, axis=1),
+        np.minimum.reduceat(Height, Starts, axis=1),
+        np.fmin.reduceat(Aspect, Starts, axis=1),
+        np.fmax.reduceat(Aspect, Starts, axis=1),
+    )
@@ -0,0 +1,61 @@
+import io
+from typing import Dict, Optional, Sequence
+
+from generate import BookType, BookTypes, GetDefaultName, GetImageGutter, GetPageMargin, OutputLayoutFile, OutputTemplateFiles
+import Layout
+from Output import MemoryOutput, Output, ZipOutput
+from PreviewCache import MemoryPreviewCache
+from PreviewWriter import PreviewFormat
+
+
+class Generator:
+    """
+    Generate layout template collections in memory, without writing to disk.
+    The layout catalog and a cache of preview thumbnails are kept between calls, so that a service
+    can generate many collections without starting a new process and redrawing the previews for
+    each of them. The results map paths relative to the output directory of generate.py to the
+    file contents. A generator can be used from several threads at once.
+    """
+    def __init__(self, CacheSize: int = 64 * 1024 * 1024, Threads: int = 0, Catalog: Optional[Sequence[Layout.Entry]] = None, Format: PreviewFormat = PreviewFormat()) -> None:
+        self.BookTypes = BookTypes
+        self.Catalog = Layout.GetCatalog() if Catalog is None else tuple(Catalog)
+        self.Cache = MemoryPreviewCache(CacheSize) if 0 < CacheSize else None
+        self.Threads = Threads
+        self.Format = Format
+
+    def GetBook(self, Book: str) -> BookType:
+        if Book not in self.BookTypes:
+            raise ValueError(f'Unknown book type "{Book}"')
+        return self.BookTypes[Book]
+
+    def Generate(self, Book: str, Margins: Sequence[int] = (0,), Gutters: Sequence[int] = (0,), Ratio: Optional[float] = None, Name: Optional[str] = None) -> Dict[str, bytes]:
+        """
+        Generate a layout template collection, with arguments as for generate.py.
+        """
+        Out = MemoryOutput()
+        self.GenerateTo(Out, Book, Margins, Gutters, Ratio, Name)
+        return Out.Files
+
+    def GenerateArchive(self, Book: str, Margins: Sequence[int] = (0,), Gutters: Sequence[int] = (0,), Ratio: Optional[float] = None, Name: Optional[str] = None) -> io.BytesIO:
+        """
+        Generate a layout template collection as a zip archive.
+        """
+        Archive = io.BytesIO()
+        with ZipOutput(Archive) as Out:
+            self.GenerateTo(Out, Book, Margins, Gutters, Ratio, Name)
+        Archive.seek(0)
+        return Archive
+
+    def GenerateTo(self, Out: Output, Book: str, Margins: Sequence[int] = (0,), Gutters: Sequence[int] = (0,), Ratio: Optional[float] = None, Name: Optional[str] = None) -> None:
+        Type = self.GetBook(Book)
+        Margins = list(Margins)
+        Gutters = list(Gutters)
+        if not 1 <= len(Margins) <= 4:
+            raise ValueError('Margins requires between 1 and 4 values')
+        if not 1 <= len(Gutters) <= 2:
+            raise ValueError('Gutters requires between 1 and 2 values')
+        if Name is None:
+            Name = GetDefaultName(Margins, Gutters, Ratio)
+
+        OutputLayoutFile(Out, Type, Name)
+        OutputTemplateFiles(Out, Type, Name, GetPageMargin(Type, Margins, Ratio), GetImageGutter(Gutters), Cache=self.Cache, Threads=self.Threads, Catalog=self.Catalog, Format=self.Format)
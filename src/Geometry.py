@@ -0,0 +1,101 @@
+import functools
+import logging
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+from Layout import Compact, SparseGrid
+
+
+class Gutter:
+    def __init__(self, Vertical: int, Horizontal: int) -> None:
+        self.Vertical = Vertical
+        self.Horizontal = Horizontal
+
+
+class Margin:
+    def __init__(self, Top: float, Right: float, Bottom: float, Left: float) -> None:
+        self.Top = Top
+        self.Right = Right
+        self.Bottom = Bottom
+        self.Left = Left
+
+
+class Cell(NamedTuple):
+    """
+    Geometry of a cell on a page.
+    Coordinates are in page units, with the origin in the lower left corner of the page. (X,Y) is
+    the upper left corner of the cell. The cell includes the padding, so the image covers the
+    area from (X+LeftPad,Y-TopPad) to (X+Width-RightPad,Y-Height+BottomPad).
+    """
+    X: float
+    Y: float
+    Width: float
+    Height: float
+    TopPad: float
+    RightPad: float
+    BottomPad: float
+    LeftPad: float
+
+
+class Tracks(NamedTuple):
+    """
+    Size and position of the rows and columns of a grid on a page.
+    RowStarts holds the top edge of each row, and ColStarts the left edge of each column,
+    including the gutter padding of the cells in them.
+    """
+    CellWidth: float
+    CellHeight: float
+    RowStarts: Tuple[float, ...]
+    ColStarts: Tuple[float, ...]
+
+
+# Many layouts have the same grid shape, so the tracks are computed once for each grid shape,
+# page and spacing. The cache is bounded, since sweeps go through many margins and gutters.
+@functools.lru_cache(maxsize=1024)
+def GetTracks(RowCount: int, ColCount: int, Dimensions: Tuple[int, int], Top: float, Right: float, Bottom: float, Left: float, Vertical: int, Horizontal: int) -> Tracks:
+    CellHeight = (Dimensions[1] - Top - Bottom - (RowCount-1) * Vertical) / RowCount
+    CellWidth = (Dimensions[0] - Left - Right - (ColCount-1) * Horizontal) / ColCount
+
+    PosY = Dimensions[1] - Top
+    RowStarts = []
+    for RowIdx in range(RowCount):
+        RowStarts.append(PosY)
+        if 0 < RowIdx:
+            PosY -= Vertical / 2
+        PosY -= CellHeight + Vertical / 2
+
+    PosX = Left
+    ColStarts = []
+    for ColIdx in range(ColCount):
+        ColStarts.append(PosX)
+        if 0 < ColIdx:
+            PosX += Horizontal / 2
+        PosX += CellWidth + Horizontal / 2
+
+    return Tracks(CellWidth, CellHeight, tuple(RowStarts), tuple(ColStarts))
+
+
+def GenerateGeometry(Grid: Union[SparseGrid, List[List[Optional[Tuple[int, int]]]]], Dimensions: Tuple[int, int], PageMargin: Margin, Gutter: Gutter) -> List[Cell]:
+    Grid = Compact(Grid)
+    RowCount = Grid.RowCount
+    ColCount = Grid.ColCount
+
+    CellWidth, CellHeight, RowStarts, ColStarts = GetTracks(RowCount, ColCount, tuple(Dimensions), PageMargin.Top, PageMargin.Right, PageMargin.Bottom, PageMargin.Left, Gutter.Vertical, Gutter.Horizontal)
+    HalfVertical = Gutter.Vertical / 2
+    HalfHorizontal = Gutter.Horizontal / 2
+
+    Cells = []
+    for RowIdx, ColIdx, ColSpan, RowSpan in Grid:
+        TopPad = HalfVertical if 0 < RowIdx else 0
+        RightPad = HalfHorizontal if ColIdx + ColSpan < ColCount else 0
+        BottomPad = HalfVertical if RowIdx + RowSpan < RowCount else 0
+        LeftPad = HalfHorizontal if 0 < ColIdx else 0
+
+        Width = LeftPad + CellWidth + RightPad + (CellWidth + Gutter.Horizontal) * (ColSpan - 1)
+        Height = BottomPad + CellHeight + TopPad + (CellHeight + Gutter.Vertical) * (RowSpan - 1)
+        if Height < 0:
+            logging.error('Cell height is negative.')
+        elif Width < 0:
+            logging.error('Cell width is negative.')
+
+        Cells.append(Cell(ColStarts[ColIdx], RowStarts[RowIdx], Width, Height, TopPad, RightPad, BottomPad, LeftPad))
+    return Cells
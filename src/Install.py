@@ -0,0 +1,158 @@
+import hashlib
+import os
+from pathlib import Path
+import shutil
+import sys
+from typing import Dict, NamedTuple
+
+from Manifest import GetFileHash
+
+
+class InstallResult(NamedTuple):
+    """
+    Number of files written because they are new or changed, left as they were, and removed.
+    """
+    Written: int = 0
+    Unchanged: int = 0
+    Removed: int = 0
+
+    def Add(self, Other: 'InstallResult') -> 'InstallResult':
+        return InstallResult(self.Written + Other.Written, self.Unchanged + Other.Unchanged, self.Removed + Other.Removed)
+
+
+def IsUnchanged(FilePath: Path, Data: bytes) -> bool:
+    try:
+        # Files of another size have changed, without having to read them.
+        if FilePath.stat().st_size != len(Data):
+            return False
+    except FileNotFoundError:
+        return False
+    return GetFileHash(FilePath) == hashlib.sha256(Data).hexdigest()
+
+
+def GetStagingDir(Dir: Path) -> Path:
+    return Dir.with_name(f'.{Dir.name}.staging')
+
+
+def GetOldDir(Dir: Path) -> Path:
+    return Dir.with_name(f'.{Dir.name}.old')
+
+
+def RecoverCollection(Dir: Path) -> None:
+    """
+    Clean up after an install of a collection that was interrupted.
+    When the installed collection has been moved away, but the staged collection not moved in,
+    the installed collection is moved back.
+    """
+    Old = GetOldDir(Dir)
+    if Old.exists():
+        if Dir.exists():
+            shutil.rmtree(Old)
+        else:
+            os.rename(Old, Dir)
+    Staging = GetStagingDir(Dir)
+    if Staging.exists():
+        shutil.rmtree(Staging)
+
+
+def ExchangeDirs(First: Path, Second: Path) -> bool:
+    """
+    Swap two directories with a single rename, where the system supports it, which is
+    renameat2 with RENAME_EXCHANGE on Linux and renamex_np with RENAME_SWAP on macOS. Get whether
+    they were swapped.
+    """
+    import ctypes
+    # Only the C library of Linux and macOS can be loaded without a path.
+    if sys.platform.startswith('linux'):
+        try:
+            RenameAt2 = ctypes.CDLL(None, use_errno=True).renameat2
+        except (AttributeError, OSError):
+            return False
+        AtCurrentDir = -100
+        RenameExchange = 2
+        return 0 == RenameAt2(AtCurrentDir, os.fsencode(First), AtCurrentDir, os.fsencode(Second), RenameExchange)
+    if 'darwin' == sys.platform:
+        try:
+            RenameXNp = ctypes.CDLL(None, use_errno=True).renamex_np
+        except (AttributeError, OSError):
+            return False
+        RenameSwap = 2
+        return 0 == RenameXNp(os.fsencode(First), os.fsencode(Second), RenameSwap)
+    return False
+
+
+def InstallCollection(Dir: Path, Files: Dict[str, bytes]) -> InstallResult:
+    """
+    Replace the contents of a collection directory with the given files, named relative to it.
+    A collection without changed, new or removed files is left as it is. Otherwise, the new
+    collection is staged in a directory next to it, where unchanged files are linked from the
+    installed collection instead of being written again. The staged collection is then switched
+    in. Where the system can exchange directories, this is atomic. Elsewhere, the collection
+    directory is missing between two renames.
+    """
+    RecoverCollection(Dir)
+    Unchanged = {Name for Name, Data in Files.items() if IsUnchanged(Dir / Name, Data)}
+    Removed = sum(1 for Installed in Dir.iterdir() if Installed.name not in Files) if Dir.exists() else 0
+    if Dir.exists() and len(Unchanged) == len(Files) and 0 == Removed:
+        return InstallResult(Unchanged=len(Unchanged))
+
+    Staging = GetStagingDir(Dir)
+    Staging.mkdir()
+    for Name, Data in Files.items():
+        if Name in Unchanged:
+            try:
+                os.link(Dir / Name, Staging / Name)
+                continue
+            except OSError:
+                # File systems without hard links get a copy.
+                pass
+        with open(Staging / Name, 'wb') as File:
+            File.write(Data)
+
+    if not Dir.exists():
+        os.rename(Staging, Dir)
+    elif ExchangeDirs(Staging, Dir):
+        # The staging directory now holds the old collection.
+        shutil.rmtree(Staging)
+    else:
+        Old = GetOldDir(Dir)
+        os.rename(Dir, Old)
+        os.rename(Staging, Dir)
+        shutil.rmtree(Old)
+    return InstallResult(len(Files) - len(Unchanged), len(Unchanged), Removed)
+
+
+def InstallFile(FilePath: Path, Data: bytes) -> InstallResult:
+    if IsUnchanged(FilePath, Data):
+        return InstallResult(Unchanged=1)
+    Staging = FilePath.with_name(f'.{FilePath.name}.staging')
+    with open(Staging, 'wb') as File:
+        File.write(Data)
+    os.replace(Staging, FilePath)
+    return InstallResult(Written=1)
+
+
+def InstallFiles(OutDir: Path, Files: Dict[str, bytes]) -> InstallResult:
+    """
+    Install generated files into an output directory, like the Lightroom layout templates
+    directory, with names relative to it as written by generate.py.
+    Each collection directory is replaced as a whole. Other files, like the .lrtemplate files
+    referring to the collections, are replaced one by one after all collections are in place.
+    """
+    Collections: Dict[str, Dict[str, bytes]] = {}
+    Others: Dict[str, bytes] = {}
+    for Name, Data in Files.items():
+        Parts = Name.split('/')
+        if 3 == len(Parts):
+            Collections.setdefault(f'{Parts[0]}/{Parts[1]}', {})[Parts[2]] = Data
+        else:
+            Others[Name] = Data
+
+    Result = InstallResult()
+    for Name, CollectionFiles in Collections.items():
+        (OutDir / Name).parent.mkdir(parents=True, exist_ok=True)
+        Result = Result.Add(InstallCollection(OutDir / Name, CollectionFiles))
+    for Name, Data in Others.items():
+        (OutDir / Name).parent.mkdir(parents=True, exist_ok=True)
+        Result = Result.Add(InstallFile(OutDir / Name, Data))
+    return Result
@@ -1,4 +1,21 @@
-from typing import List, Optional, Tuple
+from array import array
+import functools
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+
+# Transforms of layouts.
+FlipLeftRight = 'flip-left-right'
+FlipTopBottom = 'flip-top-bottom'
+Rotate180 = 'rotate-180'
+
+
+class Mirror(NamedTuple):
+    """
+    Layout that is a transform of another layout, given by its UUID.
+    """
+    Base: str
+    Transform: str
+
 
 def GetSinglePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
     """
@@ -38,6 +55,18 @@ def GetSinglePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
             [   None,   None,   (3,2),  None,   None   ],
             [   None,   None,   None,   None,   None   ],
         ]
+
+    Layouts that are declared as mirror images of other layouts are returned as grids like the
+    other layouts.
+    """
+    return ResolveMirrors(GetSinglePageDeclarations())
+
+
+def GetSinglePageDeclarations() -> List[Tuple[str, Union[Mirror, List[List[Optional[Tuple[int, int]]]]]]]:
+    """
+    Get single page layouts as declared, see GetSinglePages.
+    Layouts that are mirror images of a layout earlier in the list are declared as a Mirror of
+    that layout.
     """
     return [
         (
@@ -100,28 +129,15 @@ def GetSinglePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
         ),
         (
             '3f4de4a0-07ea-4ba5-8f8f-1523aec9b0f6',
-            [
-                [   (2,1),  None    ],
-                [   (1,1),  (1,1)   ],
-            ],
+            Mirror('edeab5bc-29b7-405d-95a1-9567f165eb1b', FlipTopBottom),
         ),
         (
             'a1803db3-cfc6-4952-89ab-6ea69d79ebd0',
-            [
-                [   (2,3),  None    ],
-                [   None,   None    ],
-                [   None,   None    ],
-                [   (1,2),  (1,2)   ],
-                [   None,   None    ],
-            ],
+            Mirror('13ab3b2d-10ff-4ba7-92bb-370759348883', FlipTopBottom),
         ),
         (
             '4819269d-a9fe-4554-b55d-edee84f8496a',
-            [
-                [   (2,2),  None    ],
-                [   None,   None    ],
-                [   (1,1),  (1,1)   ],
-            ],
+            Mirror('01d3e3eb-d872-498f-9914-732126469d7a', FlipTopBottom),
         ),
         (
             '7a208ea3-26b1-4e2a-8df9-104ab72ab46a',
@@ -146,10 +162,7 @@ def GetSinglePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
         ),
         (
             'ea90e905-f942-4f89-9782-6c81e9c219c2',
-            [
-                [   (1,2),  (1,1)   ],
-                [   None,   (1,1)   ],
-            ],
+            Mirror('7a208ea3-26b1-4e2a-8df9-104ab72ab46a', FlipLeftRight),
         ),
         (
             '48d26ed3-9afc-4544-82d9-82960d62edf6',
@@ -167,17 +180,11 @@ def GetSinglePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
         ),
         (
             '796c0b95-4134-46a7-8f9b-e481cd03e711',
-            [
-                [   (3,2),  None,   None,   (2,1),  None    ],
-                [   None,   None,   None,   (2,1),  None    ],
-            ],
+            Mirror('198e2b09-ba66-453b-ad15-fbcac9ac9270', FlipLeftRight),
         ),
         (
             'bc5f0b98-ce05-4a99-a609-37d80ce2a68a',
-            [
-                [   (2,2),  None,   (1,1)   ],
-                [   None,   None,   (1,1)   ],
-            ],
+            Mirror('a38cac06-475a-431f-9b8c-c231b9cddcd6', FlipLeftRight),
         ),
         (
             '02bff2e2-3807-4baf-8bc4-232a657569d4',
@@ -202,17 +209,11 @@ def GetSinglePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
         ),
         (
             '10069c06-9dbf-41b4-ae22-46d6d62a130e',
-            [
-                [   (2,1),  None,   (3,1),  None,   None   ],
-                [   (3,1),  None,   None,   (2,1),  None   ],
-            ],
+            Mirror('21da4cb3-b616-4bc2-b70d-174d029901a0', FlipLeftRight),
         ),
         (
             'acdfea46-b5c5-465a-b074-3ca7f7bdf8ab',
-            [
-                [   (1,1),  (2,1),  None    ],
-                [   (2,1),  None,   (1,1)   ],
-            ],
+            Mirror('9b98235f-ddab-4afd-a9f4-9694fc4a7ed2', FlipLeftRight),
         ),
         (
             '78f5352e-5890-4a14-bbb8-172ee938eacd',
@@ -226,13 +227,7 @@ def GetSinglePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
         ),
         (
             '049b71ed-88ab-46f9-8fa8-839bad919a2e',
-            [
-                [   (1,3),  (1,2)   ],
-                [   None,   None    ],
-                [   None,   (1,3)   ],
-                [   (1,2),  None    ],
-                [   None,   None    ],
-            ],
+            Mirror('78f5352e-5890-4a14-bbb8-172ee938eacd', FlipLeftRight),
         ),
         (
             'fefb8886-f4fc-4244-8b02-52d6c99f3c7c',
@@ -282,28 +277,15 @@ def GetSinglePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
         ),
         (
             '75552e19-91e8-496b-a9cb-e60e36cf9956',
-            [
-                [   (3,1),  None,   None    ],
-                [   (1,1),  (1,1),  (1,1)   ],
-            ],
+            Mirror('7dc0caa3-9a09-49b4-b3d4-f7d67e93f37a', FlipTopBottom),
         ),
         (
             '0d9f0c05-8cbe-4d99-b27f-c73dcfdf4f34',
-            [
-                [   (3,3),  None,   None    ],
-                [   None,   None,   None    ],
-                [   None,   None,   None    ],
-                [   (1,2),  (1,2),  (1,2)   ],
-                [   None,   None,   None    ],
-            ],
+            Mirror('8227fd3b-e9d9-4b47-b4ab-8545aa2da432', FlipTopBottom),
         ),
         (
             'dd1f6ffe-c2ad-44e8-9e8b-50d4f74ad37a',
-            [
-                [   (3,2),  None,   None    ],
-                [   None,   None,   None    ],
-                [   (1,1),  (1,1),  (1,1)   ],
-            ],
+            Mirror('ee1305d1-69a4-4b3a-9358-54897b33a651', FlipTopBottom),
         ),
         (
             '31873322-bc4a-44cf-9d64-504bf85b41ca',
@@ -331,27 +313,15 @@ def GetSinglePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
         ),
         (
             'e3bdc07f-0add-412b-b87a-211d1a6a288e',
-            [
-                [   (1,3),  (1,1)   ],
-                [   None,   (1,1)   ],
-                [   None,   (1,1)   ],
-            ],
+            Mirror('31873322-bc4a-44cf-9d64-504bf85b41ca', FlipLeftRight),
         ),
         (
             'a3d4875f-f213-44af-aeb7-5189f9cf000d',
-            [
-                [   (3,3),  None,   None,   (2,1),  None    ],
-                [   None,   None,   None,   (2,1),  None    ],
-                [   None,   None,   None,   (2,1),  None    ],
-            ],
+            Mirror('a5e0bc76-be1c-431c-9640-966d4bd3fccc', FlipLeftRight),
         ),
         (
             '8695db6f-80a4-4932-9070-2eab33d4f8fd',
-            [
-                [   (2,3),  None,   (1,1)   ],
-                [   None,   None,   (1,1)   ],
-                [   None,   None,   (1,1)   ],
-            ],
+            Mirror('8e7afc55-dd9f-48af-8048-c14ccb1d9219', FlipLeftRight),
         ),
         (
             '25e099ea-f874-4cd2-a86f-d248a99cb834',
@@ -362,10 +332,7 @@ def GetSinglePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
         ),
         (
             '2d20121b-d81b-4843-a6e2-48b12610e707',
-            [
-                [   (3,1),  None,   None,   (3,1),  None,   None    ],
-                [   (2,1),  None,   (2,1),  None,   (2,1),  None    ],
-            ],
+            Mirror('25e099ea-f874-4cd2-a86f-d248a99cb834', FlipTopBottom),
         ),
         (
             '1bb6e568-f69b-4187-85f8-447d9e1261cc',
@@ -380,14 +347,7 @@ def GetSinglePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
         ),
         (
             '1bde33d6-45d0-48de-9a00-10fc32f0509e',
-            [
-                [   (1,3),  (1,2)   ],
-                [   None,   None    ],
-                [   None,   (1,2)   ],
-                [   (1,3),  None    ],
-                [   None,   (1,2)   ],
-                [   None,   None    ],
-            ],
+            Mirror('1bb6e568-f69b-4187-85f8-447d9e1261cc', FlipLeftRight),
         ),
         (
             '8c61d51e-8201-4be1-b0a1-b17c16bde175',
@@ -434,27 +394,15 @@ def GetSinglePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
         ),
         (
             'c1267516-5169-4ed8-b606-0f740ac1ee13',
-            [
-                [   (1,1),  (2,2),  None    ],
-                [   (1,1),  None,   None    ],
-                [   (1,1),  (1,1),  (1,1)   ],
-            ],
+            Mirror('f7f04420-de86-4a06-a30d-3153c1529c17', FlipLeftRight),
         ),
         (
             '5bad17b7-3605-422d-8dc4-ba2c16a68e3e',
-            [
-                [   (1,1),  (1,1),  (1,1)   ],
-                [   (2,2),  None,   (1,1)   ],
-                [   None,   None,   (1,1)   ],
-            ],
+            Mirror('f7f04420-de86-4a06-a30d-3153c1529c17', FlipTopBottom),
         ),
         (
             '832659be-f72a-4520-a667-3c3cb0afe65e',
-            [
-                [   (1,1),  (1,1),  (1,1)   ],
-                [   (1,1),  (2,2),  None    ],
-                [   (1,1),  None,   None    ],
-            ],
+            Mirror('f7f04420-de86-4a06-a30d-3153c1529c17', Rotate180),
         ),
         (
             '7fd056f7-072c-4f35-ab7c-b8392e71901b',
@@ -466,11 +414,7 @@ def GetSinglePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
         ),
         (
             '427b3d49-7b03-4163-9296-19c46d757d54',
-            [
-                [   (1,1),  (1,1),  (1,1)   ],
-                [   (1,1),  (1,2),  (1,1)   ],
-                [   (1,1),  None,   (1,1)   ],
-            ],
+            Mirror('7fd056f7-072c-4f35-ab7c-b8392e71901b', FlipTopBottom),
         ),
         (
             '2cda05c9-3d8d-4b01-9a82-120bdbdc9991',
@@ -528,6 +472,13 @@ def GetDoublePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
     Get double page layouts.
     See GetSinglePages.
     """
+    return ResolveMirrors(GetDoublePageDeclarations())
+
+
+def GetDoublePageDeclarations() -> List[Tuple[str, Union[Mirror, List[List[Optional[Tuple[int, int]]]]]]]:
+    """
+    Get double page layouts as declared, see GetSinglePageDeclarations.
+    """
     return [
         (
             'cece3329-05d3-4847-8d9d-1966cabd4d1c',
@@ -543,9 +494,7 @@ def GetDoublePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
         ),
         (
             '85dc4f2b-4b18-48cb-88e7-2b2ca7057255',
-            [
-                [   (5,1),  None,   None,   None,   None,   (2,1),  None    ],
-            ],
+            Mirror('dde3bdc0-652e-4ec8-a695-e4223a71c129', FlipLeftRight),
         ),
         (
             'aaace444-5d52-4378-bf07-2b82d6502a71',
@@ -556,10 +505,7 @@ def GetDoublePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
         ),
         (
             '5e8a43bd-4581-45ed-9048-903d7875f6d6',
-            [
-                [   (5,2),  None,   None,   None,   None,   (2,1),  None    ],
-                [   None,   None,   None,   None,   None,   (2,1),  None    ],
-            ],
+            Mirror('aaace444-5d52-4378-bf07-2b82d6502a71', FlipLeftRight),
         ),
         (
             'af8ec509-feb9-4216-8dcf-293dabdcc2d3',
@@ -582,3 +528,136 @@ def GetDoublePages() -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
             ],
         ),
     ]
+
+
+class SparseGrid:
+    """
+    Compact representation of a page layout.
+    Only the placements are stored, as packed unsigned shorts of (row, column, width, height), where
+    width is the number of columns and height the number of rows covered by the image. Placements
+    are ordered by row and then by column, which is the order the images are numbered in.
+    SparseGrid is immutable and hashable.
+    """
+    __slots__ = ('RowCount', 'ColCount', 'Placements')
+    RowCount: int
+    ColCount: int
+    Placements: bytes
+
+    def __init__(self, RowCount: int, ColCount: int, Placements: Iterable[Tuple[int, int, int, int]]) -> None:
+        assert 0 < RowCount
+        assert 0 < ColCount
+        Packed = array('H')
+        for Row, Col, Width, Height in sorted(Placements):
+            assert 0 < Width
+            assert 0 < Height
+            assert Col + Width <= ColCount
+            assert Row + Height <= RowCount
+            Packed.extend((Row, Col, Width, Height))
+        object.__setattr__(self, 'RowCount', RowCount)
+        object.__setattr__(self, 'ColCount', ColCount)
+        object.__setattr__(self, 'Placements', Packed.tobytes())
+
+    def __setattr__(self, Name: str, Value: object) -> None:
+        raise AttributeError('SparseGrid is immutable')
+
+    @classmethod
+    def FromGrid(cls, Grid: List[List[Optional[Tuple[int, int]]]]) -> 'SparseGrid':
+        RowCount = len(Grid)
+        assert 0 < RowCount
+        ColCount = len(Grid[0])
+        Placements = []
+        for RowIdx, Row in enumerate(Grid):
+            assert len(Row) == ColCount
+            for ColIdx, Cell in enumerate(Row):
+                if Cell is not None:
+                    Placements.append((RowIdx, ColIdx, Cell[0], Cell[1]))
+        return cls(RowCount, ColCount, Placements)
+
+    def ToGrid(self) -> List[List[Optional[Tuple[int, int]]]]:
+        Grid: List[List[Optional[Tuple[int, int]]]] = [[None] * self.ColCount for _ in range(self.RowCount)]
+        for Row, Col, Width, Height in self:
+            Grid[Row][Col] = (Width, Height)
+        return Grid
+
+    def __len__(self) -> int:
+        return len(self.Placements) // 8
+
+    def __iter__(self) -> Iterator[Tuple[int, int, int, int]]:
+        Placements = memoryview(self.Placements).cast('H')
+        for Idx in range(0, len(Placements), 4):
+            yield (Placements[Idx], Placements[Idx+1], Placements[Idx+2], Placements[Idx+3])
+
+    def __eq__(self, Other: object) -> bool:
+        if not isinstance(Other, SparseGrid):
+            return NotImplemented
+        return (self.RowCount, self.ColCount, self.Placements) == (Other.RowCount, Other.ColCount, Other.Placements)
+
+    def __hash__(self) -> int:
+        return hash((self.RowCount, self.ColCount, self.Placements))
+
+    def __repr__(self) -> str:
+        return f'SparseGrid({self.RowCount}, {self.ColCount}, {list(self)})'
+
+
+def TransformGrid(Grid: SparseGrid, Transform: str) -> SparseGrid:
+    Placements = list(Grid)
+    if Transform in (FlipLeftRight, Rotate180):
+        Placements = [(Row, Grid.ColCount - Col - Width, Width, Height) for Row, Col, Width, Height in Placements]
+    if Transform in (FlipTopBottom, Rotate180):
+        Placements = [(Grid.RowCount - Row - Height, Col, Width, Height) for Row, Col, Width, Height in Placements]
+    return SparseGrid(Grid.RowCount, Grid.ColCount, Placements)
+
+
+def ResolveMirrors(Pages: Sequence[Tuple[str, Union[Mirror, List[List[Optional[Tuple[int, int]]]]]]]) -> List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]]:
+    Grids: Dict[str, List[List[Optional[Tuple[int, int]]]]] = {}
+    Resolved: List[Tuple[str, List[List[Optional[Tuple[int, int]]]]]] = []
+    for PageUuid, Grid in Pages:
+        if isinstance(Grid, Mirror):
+            Grid = TransformGrid(Compact(Grids[Grid.Base]), Grid.Transform).ToGrid()
+        Grids[PageUuid] = Grid
+        Resolved.append((PageUuid, Grid))
+    return Resolved
+
+
+def Compact(Grid: Union[SparseGrid, List[List[Optional[Tuple[int, int]]]]]) -> SparseGrid:
+    """
+    Get the compact representation of a page layout given either as a SparseGrid or as a
+    two-dimensional list, as described in GetSinglePages.
+    """
+    if isinstance(Grid, SparseGrid):
+        return Grid
+    return SparseGrid.FromGrid(Grid)
+
+
+class Entry(NamedTuple):
+    Uuid: str
+    Grid: SparseGrid
+    IsDoublePage: bool
+    Variant: Optional[Mirror] = None
+
+
+@functools.lru_cache(maxsize=None)
+def GetCatalog() -> Tuple[Entry, ...]:
+    """
+    Get all page layouts, single pages first and then double pages.
+    The catalog is validated and built once, and the same immutable catalog is returned on later
+    calls.
+    """
+    Catalog = []
+    Uuids = set()
+    for Pages, IsDoublePage in ((GetSinglePageDeclarations(), False), (GetDoublePageDeclarations(), True)):
+        Grids: Dict[str, SparseGrid] = {}
+        Variants = set()
+        for PageUuid, Grid in Pages:
+            assert PageUuid not in Uuids, f'Duplicate layout {PageUuid}'
+            Uuids.add(PageUuid)
+            Variant = None
+            if isinstance(Grid, Mirror):
+                assert Grid.Base in Grids and Grid.Base not in Variants, f'Base layout of {PageUuid} must be an earlier layout that is not a mirror image'
+                Variant = Grid
+                Variants.add(PageUuid)
+                Grids[PageUuid] = TransformGrid(Grids[Grid.Base], Grid.Transform)
+            else:
+                Grids[PageUuid] = SparseGrid.FromGrid(Grid)
+            Catalog.append(Entry(PageUuid, Grids[PageUuid], IsDoublePage, Variant))
+    return tuple(Catalog)
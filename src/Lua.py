@@ -0,0 +1,137 @@
+import re
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple, Union
+
+
+class Style(NamedTuple):
+    """
+    Layout of serialized Lua code.
+    Unit is the indentation of each level. Minified code has no indentation, line breaks or
+    spaces around =, and numbers without fractions are written as integers.
+    """
+    Unit: str = '\t'
+    Minified: bool = False
+
+    def GetNewline(self) -> str:
+        return '' if self.Minified else '\n'
+
+    def GetItemSeparator(self) -> str:
+        # Indented items end with their own separator, minified items are separated.
+        return ',' if self.Minified else ''
+
+    def GetIndent(self, Level: int) -> str:
+        return '' if self.Minified else self.Unit * Level
+
+    def GetNumberFormatter(self) -> Callable[[Union[int, float]], str]:
+        return FormatCompactNumber if self.Minified else FormatNumber
+
+
+class Field(NamedTuple):
+    """
+    Value filled in when a template is rendered.
+    """
+    Name: str
+
+
+class Block(NamedTuple):
+    """
+    Table whose items are filled in when a template is rendered, already serialized with
+    SerializeItem and joined with the item separator of the style.
+    """
+    Name: str
+
+
+# Marks the fields in serialized code. Serialized values cannot contain it, since strings are
+# escaped.
+Marker = '\0'
+
+Escapes = {'\\': '\\\\', '"': '\\"', '\n': '\\n', '\r': '\\r', '\t': '\\t'}
+
+NeedsEscape = re.compile(r'[\x00-\x1f\x7f"\\]')
+
+
+def Escape(Match: re.Match) -> str:
+    # Lua 5.1 only has decimal numeric escapes.
+    Char = Match.group()
+    return Escapes.get(Char) or f'\\{ord(Char):03d}'
+
+
+def Quote(Text: str) -> str:
+    return f'"{NeedsEscape.sub(Escape, Text)}"'
+
+
+def FormatNumber(Value: Union[int, float]) -> str:
+    # The shortest representation that reads back as the same value, as str gives for floats.
+    return str(Value)
+
+
+def FormatCompactNumber(Value: Union[int, float]) -> str:
+    # Whole numbers are written without fraction, since Lua 5.1 reads all numbers as floats.
+    if Value % 1 == 0 and abs(Value) < 2 ** 53:
+        return str(int(Value))
+    return str(Value)
+
+
+def Serialize(Value: Any, Format: Style = Style(), Level: int = 0) -> str:
+    """
+    Serialize a value as Lua code, with fields and blocks marked for Template.
+    Dicts are tables with named fields in the given order, and lists are tables of items. Tuples
+    of a list and a dict are tables with the items followed by the named fields.
+    """
+    if isinstance(Value, Field):
+        return f'{Marker}{Value.Name}{Marker}'
+    if isinstance(Value, Block):
+        Newline = Format.GetNewline()
+        return f'{{{Newline}{Marker}{Value.Name}{Marker}{Newline}{Format.GetIndent(Level)}}}'
+    if isinstance(Value, bool):
+        return 'true' if Value else 'false'
+    if isinstance(Value, (int, float)):
+        return Format.GetNumberFormatter()(Value)
+    if isinstance(Value, str):
+        return Quote(Value)
+
+    Items: List[Any] = []
+    Fields: Dict[str, Any] = {}
+    if isinstance(Value, tuple):
+        Items, Fields = Value
+    elif isinstance(Value, list):
+        Items = Value
+    else:
+        Fields = Value
+    Assign = '=' if Format.Minified else ' = '
+    Entries = [Serialize(Item, Format, Level + 1) for Item in Items]
+    Entries += [f'{Name}{Assign}{Serialize(FieldValue, Format, Level + 1)}' for Name, FieldValue in Fields.items()]
+    if Format.Minified:
+        return f'{{{",".join(Entries)}}}'
+    Lines = [f'{Format.GetIndent(Level + 1)}{Entry},\n' for Entry in Entries]
+    return f'{{\n{"".join(Lines)}{Format.GetIndent(Level)}}}'
+
+
+def SerializeItem(Value: Any, Format: Style, Level: int) -> str:
+    """
+    Serialize a value as an item of a table, at the level of the table's fields. Indented items
+    end with a separator, so that items can be streamed without knowing which is the last.
+    """
+    if Format.Minified:
+        return Serialize(Value, Format, Level)
+    return f'{Format.GetIndent(Level)}{Serialize(Value, Format, Level)},\n'
+
+
+class Template:
+    """
+    Lua code whose constant parts are serialized in advance, so that rendering only fills the
+    serialized values of the fields into a format string.
+    """
+    def __init__(self, Code: str) -> None:
+        self.Code = Code
+        Parts = Code.split(Marker)
+        self.Format = ''.join(f'%({Part})s' if Idx % 2 else Part.replace('%', '%%') for Idx, Part in enumerate(Parts))
+
+    def Render(self, Values: Dict[str, str]) -> str:
+        return self.Format % Values
+
+    def Split(self, Name: str) -> Tuple['Template', 'Template']:
+        """
+        Get the templates of the code before and after a field or block, to stream its value.
+        """
+        Head, Tail = self.Code.split(f'{Marker}{Name}{Marker}')
+        return Template(Head), Template(Tail)
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+import uuid
+
+
+# Namespace for deterministic IDs of papers, layouts and templates.
+Namespace = uuid.UUID('5d0bd5f4-3bc7-4b2c-9f38-1f8b5f3c1a44')
+
+# Increase when the generated output changes for unchanged inputs, to invalidate old manifests.
+Version = 1
+
+
+def GetUuid(*Parts: Any) -> uuid.UUID:
+    return uuid.uuid5(Namespace, json.dumps(Parts))
+
+
+def GetHash(*Parts: Any) -> str:
+    return hashlib.sha256(json.dumps([Version, *Parts]).encode()).hexdigest()
+
+
+def GetFileHash(FilePath: Path) -> Optional[str]:
+    try:
+        with open(FilePath, 'rb') as File:
+            return hashlib.sha256(File.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+class Manifest:
+    """
+    Record of the inputs and outputs of a generated layout template collection.
+    The manifest is stored in the collection directory. For each page, it holds a hash of the
+    inputs the page was generated from and a hash of the generated preview, so that later runs can
+    skip pages whose inputs have not changed and whose previews are intact.
+    """
+    FileName = '.manifest.json'
+
+    def __init__(self, Dir: Path) -> None:
+        self.Dir = Dir
+        self.Collection: Optional[str] = None
+        self.Pages: Dict[str, Dict[str, str]] = {}
+        self.Files: Dict[str, str] = {}
+        try:
+            with open(Dir / self.FileName) as File:
+                Data = json.load(File)
+            if Version == Data.get('version'):
+                self.Collection = Data['collection']
+                self.Pages = Data['pages']
+                self.Files = Data['files']
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+
+    def IsFileCurrent(self, Name: str) -> bool:
+        return Name in self.Files and self.Files[Name] == GetFileHash(self.Dir / Name)
+
+    def IsCollectionCurrent(self, Collection: str) -> bool:
+        if self.Collection != Collection:
+            return False
+        return all(self.IsFileCurrent(Name) for Name in self.Files)
+
+    def IsPageCurrent(self, PageUuid: str, Input: str) -> bool:
+        Page = self.Pages.get(PageUuid)
+        return Page is not None and Page['input'] == Input and self.IsFileCurrent(Page['preview'])
+
+    def SetPage(self, PageUuid: str, Input: str, Preview: str) -> None:
+        self.Pages[PageUuid] = {'input': Input, 'preview': Preview}
+        self.SetFile(Preview)
+
+    def SetFile(self, Name: str) -> None:
+        Hash = GetFileHash(self.Dir / Name)
+        assert Hash is not None
+        self.Files[Name] = Hash
+
+    def RemoveStalePages(self, PageUuids: set) -> None:
+        for PageUuid in list(self.Pages):
+            if PageUuid not in PageUuids:
+                Preview = self.Pages.pop(PageUuid)['preview']
+                self.Files.pop(Preview, None)
+                try:
+                    os.remove(self.Dir / Preview)
+                except FileNotFoundError:
+                    pass
+
+    def Save(self, Collection: str) -> None:
+        self.Collection = Collection
+        Temp = self.Dir / f'{self.FileName}.tmp'
+        with open(Temp, 'w') as File:
+            json.dump({'version': Version, 'collection': Collection, 'pages': self.Pages, 'files': self.Files}, File, indent='\t', sort_keys=True)
+        os.replace(Temp, self.Dir / self.FileName)
@@ -0,0 +1,138 @@
+from abc import ABC, abstractmethod
+import io
+from pathlib import Path
+import threading
+from typing import Any, BinaryIO, Dict, Optional, TextIO, Union
+import zipfile
+
+
+class Output(ABC):
+    """
+    Destination of generated files.
+    Files are named by their path relative to the output directory, with / as separator.
+    """
+    @abstractmethod
+    def MakeDir(self, Name: str) -> None:
+        pass
+
+    @abstractmethod
+    def Read(self, Name: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def Write(self, Name: str, Data: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def Open(self, Name: str) -> TextIO:
+        """
+        Open a text file for streaming to the output. The file is complete when it is closed.
+        """
+
+
+class DirOutput(Output):
+    """
+    Output to files in a directory.
+    """
+    def __init__(self, Dir: Path, BufferSize: int = -1) -> None:
+        self.Dir = Dir
+        self.BufferSize = BufferSize
+
+    def MakeDir(self, Name: str) -> None:
+        (self.Dir / Name).mkdir(exist_ok=True)
+
+    def Read(self, Name: str) -> Optional[bytes]:
+        try:
+            with open(self.Dir / Name, 'rb') as File:
+                return File.read()
+        except FileNotFoundError:
+            return None
+
+    def Write(self, Name: str, Data: bytes) -> None:
+        with open(self.Dir / Name, 'wb') as File:
+            File.write(Data)
+
+    def Open(self, Name: str) -> TextIO:
+        return open(self.Dir / Name, 'w', buffering=self.BufferSize)
+
+
+class MemoryFile(io.StringIO):
+    """
+    Text file that is written to an output when it is closed.
+    """
+    def __init__(self, Output: Output, Name: str) -> None:
+        super().__init__()
+        self.Output = Output
+        self.Name = Name
+
+    def close(self) -> None:
+        if not self.closed:
+            self.Output.Write(self.Name, self.getvalue().encode())
+        super().close()
+
+
+class MemoryOutput(Output):
+    """
+    Output to a mapping from file names to file contents.
+    Files can be written from several threads.
+    """
+    def __init__(self) -> None:
+        self.Files: Dict[str, bytes] = {}
+        self.Lock = threading.Lock()
+
+    def MakeDir(self, Name: str) -> None:
+        pass
+
+    def Read(self, Name: str) -> Optional[bytes]:
+        with self.Lock:
+            return self.Files.get(Name)
+
+    def Write(self, Name: str, Data: bytes) -> None:
+        with self.Lock:
+            self.Files[Name] = bytes(Data)
+
+    def Open(self, Name: str) -> TextIO:
+        return MemoryFile(self, Name)
+
+
+class ZipOutput(Output):
+    """
+    Output to a zip archive.
+    PNG files are already compressed, so they are stored as they are. Other files are deflated.
+    Only one file in a zip archive can be streamed at a time, so text files are kept in memory
+    until they are closed. Files can be written from several threads.
+    """
+    def __init__(self, File: Union[Path, BinaryIO]) -> None:
+        self.Archive = zipfile.ZipFile(File, 'w')
+        self.Lock = threading.Lock()
+
+    def __enter__(self) -> 'ZipOutput':
+        return self
+
+    def __exit__(self, *Args: Any) -> None:
+        self.Close()
+
+    def Close(self) -> None:
+        self.Archive.close()
+
+    def MakeDir(self, Name: str) -> None:
+        pass
+
+    def Read(self, Name: str) -> Optional[bytes]:
+        return None
+
+    def Write(self, Name: str, Data: bytes) -> None:
+        with self.Lock:
+            self.Archive.writestr(Name, Data, zipfile.ZIP_STORED if Name.endswith('.png') else zipfile.ZIP_DEFLATED)
+
+    def Open(self, Name: str) -> TextIO:
+        return MemoryFile(self, Name)
+
+
+def GetOutput(OutDir: Union[Path, Output], BufferSize: int = -1) -> Output:
+    """
+    Get the output for an output directory, or the output itself if it already is an output.
+    """
+    if isinstance(OutDir, Output):
+        return OutDir
+    return DirOutput(Path(OutDir), BufferSize)
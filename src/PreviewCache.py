@@ -0,0 +1,111 @@
+import collections
+import hashlib
+import os
+from pathlib import Path
+import threading
+from typing import List, Optional, Tuple
+import uuid
+
+
+class PreviewCache:
+    """
+    Persistent cache of preview thumbnails.
+    Previews are stored by a hash of the thumbnail size and the rectangles drawn on it. Many
+    margin and gutter combinations give identical rectangles once they are scaled down to the
+    thumbnail size, so the previews can be copied from the cache instead of being redrawn. When
+    the cache grows larger than MaxSize bytes, the least recently used previews are evicted.
+    The cache can be shared between processes.
+    """
+    def __init__(self, Dir: Path, MaxSize: int) -> None:
+        self.Dir = Dir
+        self.MaxSize = MaxSize
+        self.Size: Optional[int] = None
+
+    @staticmethod
+    def GetKey(Size: Tuple[int, int], Rectangles: List[Tuple[int, int, int, int]], Format: Optional[Tuple] = None) -> str:
+        """
+        Get the key of a preview with the given rectangles. Previews in a format other than the
+        default are given their format.
+        """
+        Parts: Tuple = (Size, Rectangles)
+        if Format is not None:
+            Parts += (tuple(Format),)
+        return hashlib.sha256(repr(Parts).encode()).hexdigest()
+
+    def GetPath(self, Key: str) -> Path:
+        return self.Dir / Key[:2] / f'{Key}.png'
+
+    def Fetch(self, Key: str) -> Optional[bytes]:
+        Source = self.GetPath(Key)
+        try:
+            with open(Source, 'rb') as File:
+                Data = File.read()
+            os.utime(Source)
+        except FileNotFoundError:
+            return None
+        return Data
+
+    def Store(self, Key: str, Data: bytes) -> None:
+        Destination = self.GetPath(Key)
+        Destination.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so that other processes never see partial previews.
+        Temp = Destination.with_name(f'.{uuid.uuid4()}.tmp')
+        with open(Temp, 'wb') as File:
+            File.write(Data)
+        os.replace(Temp, Destination)
+
+        if self.Size is None:
+            self.Size = sum(Entry.stat().st_size for Entry in self.Dir.glob('*/*.png'))
+        else:
+            self.Size += len(Data)
+        if self.MaxSize < self.Size:
+            self.Evict()
+
+    def Evict(self) -> None:
+        Entries = []
+        for Entry in self.Dir.glob('*/*.png'):
+            try:
+                Stat = Entry.stat()
+            except FileNotFoundError:
+                continue
+            Entries.append((Stat.st_mtime, Stat.st_size, Entry))
+        Entries.sort()
+
+        self.Size = sum(Entry[1] for Entry in Entries)
+        # Evict down to 90% of the maximum size, so that eviction does not run on every store.
+        for _, Size, Entry in Entries:
+            if self.Size <= self.MaxSize * 0.9:
+                break
+            try:
+                Entry.unlink()
+            except FileNotFoundError:
+                pass
+            self.Size -= Size
+
+
+class MemoryPreviewCache:
+    """
+    Cache of preview thumbnails in memory, with the same keys as PreviewCache.
+    When the cache grows larger than MaxSize bytes, the least recently used previews are evicted.
+    """
+    def __init__(self, MaxSize: int) -> None:
+        self.MaxSize = MaxSize
+        self.Size = 0
+        self.Previews: 'collections.OrderedDict[str, bytes]' = collections.OrderedDict()
+        self.Lock = threading.Lock()
+
+    def Fetch(self, Key: str) -> Optional[bytes]:
+        with self.Lock:
+            Data = self.Previews.get(Key)
+            if Data is not None:
+                self.Previews.move_to_end(Key)
+            return Data
+
+    def Store(self, Key: str, Data: bytes) -> None:
+        with self.Lock:
+            if Key in self.Previews:
+                self.Size -= len(self.Previews.pop(Key))
+            self.Previews[Key] = Data
+            self.Size += len(Data)
+            while self.MaxSize < self.Size:
+                self.Size -= len(self.Previews.popitem(last=False)[1])
@@ -0,0 +1,82 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import io
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from Output import Output
+from Profiler import Profiler
+
+
+class PreviewFormat(NamedTuple):
+    """
+    Format of preview thumbnails.
+    Compact previews are paletted images with only the colours used in previews, which are about
+    half the size of RGB previews. CompressionLevel is the zlib compression level from 0 to 9, or
+    None for the default of Pillow.
+    """
+    Compact: bool = False
+    CompressionLevel: Optional[int] = None
+
+    def GetSaveOptions(self) -> Dict[str, Any]:
+        if self.CompressionLevel is None:
+            return {}
+        return {'compress_level': self.CompressionLevel}
+
+
+class PreviewWriter:
+    """
+    Encode and write preview thumbnails.
+    With no threads, thumbnails are written immediately. Otherwise they are handed to a pool of
+    threads, so that the calling thread can continue while Pillow encodes the PNG files. At most
+    two thumbnails per thread are queued at any time. The Done callbacks are always run on the
+    calling thread, in the order the thumbnails were written: immediately without threads, and
+    from Wait with threads. They are given the encoded PNG data.
+    """
+    def __init__(self, Threads: int = 0, Profile: Optional[Profiler] = None, Format: PreviewFormat = PreviewFormat()) -> None:
+        self.Profile = Profile if Profile is not None else Profiler()
+        self.Format = Format
+        self.Executor = ThreadPoolExecutor(Threads) if 0 < Threads else None
+        self.Slots = threading.BoundedSemaphore(2 * max(Threads, 1))
+        self.Pending: List[Tuple[Future, Optional[Callable[[bytes], None]]]] = []
+
+    def __enter__(self) -> 'PreviewWriter':
+        return self
+
+    def __exit__(self, *Args: Any) -> None:
+        if self.Executor is not None:
+            self.Executor.shutdown(wait=True)
+
+    def Save(self, Thumbnail: Any, Out: Output, Name: str, Page: Optional[str]) -> bytes:
+        with self.Profile.Stage('encode', Page):
+            Buffer = io.BytesIO()
+            Thumbnail.save(Buffer, 'PNG', **self.Format.GetSaveOptions())
+            Data = Buffer.getvalue()
+        with self.Profile.Stage('write', Page):
+            Out.Write(Name, Data)
+        return Data
+
+    def Write(self, Thumbnail: Any, Out: Output, Name: str, Done: Optional[Callable[[bytes], None]] = None, Page: Optional[str] = None) -> None:
+        if self.Executor is None:
+            Data = self.Save(Thumbnail, Out, Name, Page)
+            if Done is not None:
+                Done(Data)
+            return
+
+        self.Slots.acquire()
+        try:
+            Result = self.Executor.submit(self.Save, Thumbnail, Out, Name, Page)
+        except BaseException:
+            self.Slots.release()
+            raise
+        Result.add_done_callback(lambda _: self.Slots.release())
+        self.Pending.append((Result, Done))
+
+    def Wait(self) -> None:
+        """
+        Wait until all thumbnails are written, and run their Done callbacks.
+        """
+        Pending, self.Pending = self.Pending, []
+        for Result, Done in Pending:
+            Data = Result.result()
+            if Done is not None:
+                Done(Data)
@@ -0,0 +1,179 @@
+import contextlib
+import json
+import os
+from pathlib import Path
+import threading
+import time
+import tracemalloc
+from typing import Any, ContextManager, Dict, List, NamedTuple, Optional
+
+
+class Event(NamedTuple):
+    """
+    One run of a stage.
+    Start is in seconds since profiling started. SelfDuration excludes the time spent in stages
+    nested in this stage. Peak is the peak memory allocated during the stage, in bytes above the
+    memory allocated when the stage started.
+    """
+    Stage: str
+    Page: Optional[str]
+    Thread: int
+    Start: float
+    Duration: float
+    SelfDuration: float
+    Peak: int
+
+
+class StageTimer:
+    def __init__(self, Profiler: 'Profiler', Name: str, Page: Optional[str]) -> None:
+        self.Profiler = Profiler
+        self.Name = Name
+        self.Page = Page
+        # Memory allocated when the stage started, and the peak so far, in bytes.
+        self.Base = 0
+        self.Peak = 0
+        # Time spent in stages nested in this stage, in seconds.
+        self.Children = 0.0
+        self.Start = 0.0
+
+    def __enter__(self) -> 'StageTimer':
+        Stack = self.Profiler.GetStack()
+        Current, Peak = tracemalloc.get_traced_memory()
+        # The peak is reset for each stage, so the peak so far must be kept for the enclosing stage.
+        if Stack:
+            Stack[-1].Peak = max(Stack[-1].Peak, Peak)
+        # Python 3.8 and older cannot reset the peak, so stages then get the peak of the run so far.
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        self.Base = Current
+        self.Peak = Current
+        self.Children = 0.0
+        Stack.append(self)
+        self.Start = time.perf_counter()
+        return self
+
+    def __exit__(self, *Args: Any) -> None:
+        Duration = time.perf_counter() - self.Start
+        Stack = self.Profiler.GetStack()
+        Stack.pop()
+        self.Peak = max(self.Peak, tracemalloc.get_traced_memory()[1])
+        if Stack:
+            Stack[-1].Peak = max(Stack[-1].Peak, self.Peak)
+            Stack[-1].Children += Duration
+        self.Profiler.Record(Event(self.Name, self.Page, threading.get_ident(), self.Start - self.Profiler.Start, Duration, Duration - self.Children, self.Peak - self.Base))
+
+
+class Profiler:
+    """
+    Record wall time, call counts and peak memory of the stages of generating layout templates.
+    The stages are geometry, draw, encode, lua, write and install. Stages can be nested, and the time of a
+    stage in the summary excludes the stages nested in it. Memory is traced with tracemalloc,
+    which makes everything considerably slower. When preview thumbnails are written on a pool of
+    threads, the memory peaks of stages running at the same time are not separated. Before Python
+    3.9, the memory peak of a stage is the peak of the whole run until the stage ended.
+    A disabled profiler records nothing.
+    """
+    Stages = ('geometry', 'draw', 'encode', 'lua', 'write', 'install')
+    Disabled = contextlib.nullcontext()
+
+    def __init__(self, Enabled: bool = False) -> None:
+        self.Enabled = Enabled
+        self.Events: List[Event] = []
+        self.Lock = threading.Lock()
+        self.Local = threading.local()
+        self.Start = time.perf_counter()
+        self.Thread = threading.get_ident()
+        self.WallTime = 0.0
+
+    def __enter__(self) -> 'Profiler':
+        if self.Enabled:
+            tracemalloc.start()
+        self.Start = time.perf_counter()
+        self.Thread = threading.get_ident()
+        return self
+
+    def __exit__(self, *Args: Any) -> None:
+        self.WallTime = time.perf_counter() - self.Start
+        if self.Enabled:
+            tracemalloc.stop()
+
+    def GetStack(self) -> List[StageTimer]:
+        if not hasattr(self.Local, 'Stack'):
+            self.Local.Stack = []
+        return self.Local.Stack
+
+    def Stage(self, Name: str, Page: Optional[str] = None) -> ContextManager:
+        if not self.Enabled:
+            return self.Disabled
+        return StageTimer(self, Name, Page)
+
+    def Record(self, Event: Event) -> None:
+        with self.Lock:
+            self.Events.append(Event)
+
+    def GetStages(self) -> Dict[str, Dict[str, float]]:
+        Stages: Dict[str, Dict[str, float]] = {}
+        for Event in self.Events:
+            Stage = Stages.setdefault(Event.Stage, {'calls': 0, 'seconds': 0.0, 'peak': 0})
+            Stage['calls'] += 1
+            Stage['seconds'] += Event.SelfDuration
+            Stage['peak'] = max(Stage['peak'], Event.Peak)
+        return dict(sorted(Stages.items(), key=lambda Stage: self.Stages.index(Stage[0]) if Stage[0] in self.Stages else len(self.Stages)))
+
+    def GetPages(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        Pages: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for Event in self.Events:
+            if Event.Page is None:
+                continue
+            Stage = Pages.setdefault(Event.Page, {}).setdefault(Event.Stage, {'calls': 0, 'seconds': 0.0, 'peak': 0})
+            Stage['calls'] += 1
+            Stage['seconds'] += Event.SelfDuration
+            Stage['peak'] = max(Stage['peak'], Event.Peak)
+        return Pages
+
+    def PrintSummary(self, PageCount: int = 5) -> None:
+        Stages = self.GetStages()
+        print(f'{"Stage":<10}  {"Calls":>7}  {"Seconds":>8}  {"Share":>6}  {"Peak KiB":>9}')
+        for Name, Stage in Stages.items():
+            print(f'{Name:<10}  {Stage["calls"]:>7}  {Stage["seconds"]:>8.3f}  {Stage["seconds"] / self.WallTime:>6.1%}  {Stage["peak"] / 1024:>9.1f}')
+        # Stages on other threads overlap the time on the thread that started profiling.
+        Other = self.WallTime - sum(Event.SelfDuration for Event in self.Events if Event.Thread == self.Thread)
+        print(f'{"other":<10}  {"":>7}  {Other:>8.3f}  {Other / self.WallTime:>6.1%}')
+        print(f'{"total":<10}  {"":>7}  {self.WallTime:>8.3f}')
+
+        Pages = sorted(self.GetPages().items(), key=lambda Page: -sum(Stage['seconds'] for Stage in Page[1].values()))
+        if Pages and 0 < PageCount:
+            print()
+            print(f'{"Slowest pages":<36}  {"Seconds":>8}')
+            for Page, PageStages in Pages[:PageCount]:
+                print(f'{Page:<36}  {sum(Stage["seconds"] for Stage in PageStages.values()):>8.3f}')
+
+    def Save(self, FilePath: Path, Format: str = 'json') -> None:
+        """
+        Save the recorded events, either as JSON with a summary per stage and per page, or in the
+        Chrome trace event format.
+        """
+        if 'chrome' == Format:
+            Data: Dict[str, Any] = {
+                'traceEvents': [{
+                    'name': Event.Stage,
+                    'cat': 'stage',
+                    'ph': 'X',
+                    'ts': Event.Start * 1e6,
+                    'dur': Event.Duration * 1e6,
+                    'pid': os.getpid(),
+                    'tid': Event.Thread,
+                    'args': {'page': Event.Page, 'peak': Event.Peak},
+                } for Event in self.Events],
+                'displayTimeUnit': 'ms',
+            }
+        else:
+            Data = {
+                'seconds': self.WallTime,
+                'stages': self.GetStages(),
+                'pages': self.GetPages(),
+                'events': [Event._asdict() for Event in self.Events],
+            }
+        with open(FilePath, 'w') as File:
+            json.dump(Data, File, indent=4)
+            File.write('\n')
@@ -0,0 +1,97 @@
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from Layout import Entry, FlipLeftRight, FlipTopBottom, Rotate180, SparseGrid, TransformGrid
+
+
+class Issue(NamedTuple):
+    """
+    Problem found in a layout.
+    Kind is one of:
+    - 'overlap': Images in the layout cover the same cells.
+    - 'gap': Cells in the layout are not covered by any image.
+    - 'duplicate': The layout is identical to another layout.
+    - 'mirror': The layout is a mirror image of another layout.
+    Overlaps and duplicates are errors. Gaps and mirrors are often intentional.
+    """
+    Uuid: str
+    Kind: str
+    Message: str
+
+    def IsError(self) -> bool:
+        return self.Kind in ('overlap', 'duplicate')
+
+
+def GetRectangleMask(ColCount: int, Row: int, Col: int, Width: int, Height: int) -> int:
+    """
+    Get the occupancy bitmap of a rectangle in a grid with ColCount columns.
+    Cell (Row,Col) is bit Row*ColCount+Col.
+    """
+    RowMask = ((1 << Width) - 1) << Col
+    # Multiplying by 1 + 2^C + 2^2C + ... repeats the row mask on each row of the rectangle.
+    Repeat = ((1 << (Height * ColCount)) - 1) // ((1 << ColCount) - 1)
+    return RowMask * Repeat << (Row * ColCount)
+
+
+def GetOccupancy(Grid: SparseGrid) -> Tuple[int, int]:
+    """
+    Rasterize a layout into occupancy bitmaps.
+    Returns a bitmap of the cells covered by any image, and a bitmap of the cells covered by more
+    than one image.
+    """
+    Occupied = 0
+    Overlap = 0
+    for Row, Col, Width, Height in Grid:
+        Mask = GetRectangleMask(Grid.ColCount, Row, Col, Width, Height)
+        Overlap |= Occupied & Mask
+        Occupied |= Mask
+    return Occupied, Overlap
+
+
+def GetCells(Bitmap: int, ColCount: int) -> List[Tuple[int, int]]:
+    Cells = []
+    while Bitmap:
+        Bit = (Bitmap & -Bitmap).bit_length() - 1
+        Cells.append(divmod(Bit, ColCount))
+        Bitmap &= Bitmap - 1
+    return Cells
+
+
+def GetMirrorCanonicalForm(Grid: SparseGrid) -> SparseGrid:
+    """
+    Get the same representative for a layout and all its mirror images.
+    """
+    Forms = [Grid] + [TransformGrid(Grid, Transform) for Transform in (FlipLeftRight, FlipTopBottom, Rotate180)]
+    return min(Forms, key=lambda Form: Form.Placements)
+
+
+def FormatCells(Cells: List[Tuple[int, int]]) -> str:
+    return ', '.join(f'({Row},{Col})' for Row, Col in Cells)
+
+
+def ValidateCatalog(Catalog: Iterable[Entry]) -> List[Issue]:
+    Issues = []
+    Layouts: Dict[Tuple[SparseGrid, bool], List[str]] = {}
+    Families: Dict[Tuple[SparseGrid, bool], List[str]] = {}
+    for Entry in Catalog:
+        Grid = Entry.Grid
+        Occupied, Overlap = GetOccupancy(Grid)
+        if Overlap:
+            Issues.append(Issue(Entry.Uuid, 'overlap', f'Cells covered by more than one image: {FormatCells(GetCells(Overlap, Grid.ColCount))}.'))
+        Gaps = ((1 << (Grid.RowCount * Grid.ColCount)) - 1) & ~Occupied
+        if Gaps:
+            Issues.append(Issue(Entry.Uuid, 'gap', f'Cells not covered by any image: {FormatCells(GetCells(Gaps, Grid.ColCount))}.'))
+
+        Layouts.setdefault((Grid, Entry.IsDoublePage), []).append(Entry.Uuid)
+        Families.setdefault((GetMirrorCanonicalForm(Grid), Entry.IsDoublePage), []).append(Entry.Uuid)
+
+    for Uuids in Layouts.values():
+        for Uuid in Uuids[1:]:
+            Issues.append(Issue(Uuid, 'duplicate', f'Identical to layout {Uuids[0]}.'))
+
+    Duplicates = {Uuid for Uuids in Layouts.values() for Uuid in Uuids[1:]}
+    for Uuids in Families.values():
+        Mirrors = [Uuid for Uuid in Uuids if Uuid not in Duplicates]
+        for Uuid in Mirrors[1:]:
+            Issues.append(Issue(Uuid, 'mirror', f'Mirror image of layout {Mirrors[0]}.'))
+
+    return Issues
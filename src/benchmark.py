@@ -0,0 +1,299 @@
+import argparse
+import datetime
+import io
+import functools
+import json
+import logging
+import os
+from pathlib import Path
+import platform
+import statistics
+import subprocess
+import tempfile
+import timeit
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from Enumeration import EnumerateLayouts
+from Geometry import GenerateGeometry
+from generate import BookType, BookTypes, DrawRectangles, GenerateCells, GenerateTemplate, GetDefaultName, GetImageGutter, GetPageMargin, GetThumbnailDimensions, GetThumbnailRectangles, NewThumbnail, OutputLayoutFile, OutputTemplateFiles, RenderThumbnails
+import Layout
+from PreviewWriter import PreviewFormat
+
+
+# Margins, gutter and ratio used for all benchmarks.
+Margins = [30, 20]
+Gutters = [10]
+Ratio = 1.5
+
+
+class Benchmark:
+    def __init__(self, Name: str, Function: Callable[[], object], Repeat: Optional[int] = None, Info: Optional[Callable[[], Dict[str, float]]] = None) -> None:
+        self.Name = Name
+        self.Function = Function
+        self.Repeat = Repeat
+        self.Info = Info
+
+
+@functools.lru_cache(maxsize=None)
+def GetSyntheticCatalog(Count: int) -> List[Layout.Entry]:
+    """
+    Get a catalog of Count distinct layouts.
+    The layouts are enumerated procedurally on a 4 x 5 grid, which gives 24491 layouts.
+    """
+    Catalog = EnumerateLayouts(4, 5, 8)
+    assert Count <= len(Catalog), f'At most {len(Catalog)} synthetic layouts are available'
+    return Catalog[:Count]
+
+
+def GetLargeGridCatalog(Size: int) -> List[Layout.Entry]:
+    """
+    Get a catalog with a single Size x Size layout with one image in each cell.
+    """
+    Grid = Layout.SparseGrid(Size, Size, [(Row, Col, 1, 1) for Row in range(Size) for Col in range(Size)])
+    return [Layout.Entry(f'grid-{Size}x{Size}', Grid, False)]
+
+
+def RunGenerateCells(Book: BookType, Catalog: List[Layout.Entry], Gutters: List[int] = Gutters) -> None:
+    PageMargin = GetPageMargin(Book, Margins, Ratio)
+    ImageGutter = GetImageGutter(Gutters)
+    for Entry in Catalog:
+        Dimensions = Book.GetDimensions()
+        if Entry.IsDoublePage:
+            Dimensions = (Dimensions[0] * 2, Dimensions[1])
+        Thumbnail = Image.new('RGB', GetThumbnailDimensions(Dimensions), 'white')
+        GenerateCells(Thumbnail, Entry.Grid, Dimensions, PageMargin, ImageGutter)
+
+
+def RunGenerateGeometry(Book: BookType, Catalog: List[Layout.Entry]) -> None:
+    PageMargin = GetPageMargin(Book, Margins, Ratio)
+    ImageGutter = GetImageGutter(Gutters)
+    for Entry in Catalog:
+        Dimensions = Book.GetDimensions()
+        if Entry.IsDoublePage:
+            Dimensions = (Dimensions[0] * 2, Dimensions[1])
+        GenerateGeometry(Entry.Grid, Dimensions, PageMargin, ImageGutter)
+
+
+def RunGenerateTemplate(Book: BookType, Catalog: List[Layout.Entry], Gutters: List[int] = Gutters, Minified: bool = False) -> int:
+    Name = GetDefaultName(Margins, Gutters, Ratio)
+    PageMargin = GetPageMargin(Book, Margins, Ratio)
+    ImageGutter = GetImageGutter(Gutters)
+    Size = 0
+    for Entry in Catalog:
+        Dimensions = Book.GetDimensions()
+        if Entry.IsDoublePage:
+            Dimensions = (Dimensions[0] * 2, Dimensions[1])
+        Cells = GenerateGeometry(Entry.Grid, Dimensions, PageMargin, ImageGutter)
+        Size += len(''.join(GenerateTemplate(Book, Name, Entry.Uuid, Cells, Dimensions, Entry.IsDoublePage, Minified)))
+    return Size
+
+
+def GetThumbnails(Book: BookType, Catalog: List[Layout.Entry], Format: PreviewFormat) -> List[Any]:
+    PageMargin = GetPageMargin(Book, Margins, Ratio)
+    ImageGutter = GetImageGutter(Gutters)
+    Thumbnails = []
+    for Entry in Catalog:
+        Dimensions = Book.GetDimensions()
+        if Entry.IsDoublePage:
+            Dimensions = (Dimensions[0] * 2, Dimensions[1])
+        Thumbnail = NewThumbnail(GetThumbnailDimensions(Dimensions), Format)
+        DrawRectangles(Thumbnail, GetThumbnailRectangles(GenerateGeometry(Entry.Grid, Dimensions, PageMargin, ImageGutter), Dimensions))
+        Thumbnails.append(Thumbnail)
+    return Thumbnails
+
+
+def RenderCatalogThumbnails(Book: BookType, Catalog: List[Layout.Entry]) -> List[Any]:
+    return RenderThumbnails(Book, [Entry.Grid for Entry in Catalog], [Entry.IsDoublePage for Entry in Catalog], GetPageMargin(Book, Margins, Ratio), GetImageGutter(Gutters))
+
+
+def EncodeThumbnails(Thumbnails: List[Any], Format: PreviewFormat) -> int:
+    Size = 0
+    for Thumbnail in Thumbnails:
+        Buffer = io.BytesIO()
+        Thumbnail.save(Buffer, 'PNG', **Format.GetSaveOptions())
+        Size += len(Buffer.getbuffer())
+    return Size
+
+
+def RunOutputTemplateFiles(OutDir: Path, Book: BookType, Catalog: Optional[List[Layout.Entry]] = None) -> None:
+    Name = GetDefaultName(Margins, Gutters, Ratio)
+    Path(f'{OutDir}/{Book.Name}').mkdir(exist_ok=True)
+    OutputTemplateFiles(OutDir, Book, Name, GetPageMargin(Book, Margins, Ratio), GetImageGutter(Gutters), Catalog=Catalog)
+
+
+def RunGenerate(OutDir: Path, Book: BookType) -> None:
+    # Same steps as generate.py.
+    Name = GetDefaultName(Margins, Gutters, Ratio)
+    OutputLayoutFile(OutDir, Book, Name)
+    OutputTemplateFiles(OutDir, Book, Name, GetPageMargin(Book, Margins, Ratio), GetImageGutter(Gutters))
+
+
+def RunOnSyntheticCatalog(Count: int, Function: Callable[..., object], *Args: Any) -> object:
+    """
+    Run a benchmark function with a synthetic catalog of Count layouts as its last argument.
+    """
+    return Function(*Args, GetSyntheticCatalog(Count))
+
+
+@functools.lru_cache(maxsize=None)
+def GetCatalogThumbnails(Format: PreviewFormat) -> List[Any]:
+    """
+    Get the previews of the layout catalog for Standard Landscape, drawn in the given format.
+    """
+    return GetThumbnails(BookTypes['Standard Landscape'], list(Layout.GetCatalog()), Format)
+
+
+def EncodeCatalogThumbnails(Format: PreviewFormat) -> int:
+    return EncodeThumbnails(GetCatalogThumbnails(Format), Format)
+
+
+def GetEncodeInfo(Format: PreviewFormat) -> Dict[str, float]:
+    return {'bytes per preview': EncodeCatalogThumbnails(Format) / len(GetCatalogThumbnails(Format))}
+
+
+def GetTemplateInfo(Book: BookType, Catalog: List[Layout.Entry], Minified: bool) -> Dict[str, float]:
+    return {'bytes per page': RunGenerateTemplate(Book, Catalog, Minified=Minified) / len(Catalog)}
+
+
+def DrawCatalogPreviews(Book: BookType, GetCatalog: Callable[[], List[Layout.Entry]], Renderer: str) -> List[Any]:
+    if 'numpy' == Renderer:
+        return RenderCatalogThumbnails(Book, GetCatalog())
+    return GetThumbnails(Book, GetCatalog(), PreviewFormat())
+
+
+def GetBenchmarks(OutDir: Path) -> List[Benchmark]:
+    Catalog = list(Layout.GetCatalog())
+    Benchmarks = []
+    for BookName, Book in BookTypes.items():
+        Benchmarks.append(Benchmark(f'GenerateCells/{BookName}', functools.partial(RunGenerateCells, Book, Catalog)))
+        Benchmarks.append(Benchmark(f'GenerateTemplate/{BookName}', functools.partial(RunGenerateTemplate, Book, Catalog)))
+        Benchmarks.append(Benchmark(f'OutputTemplateFiles/{BookName}', functools.partial(RunOutputTemplateFiles, OutDir, Book)))
+        Benchmarks.append(Benchmark(f'Generate/{BookName}', functools.partial(RunGenerate, OutDir, Book)))
+
+    Book = BookTypes['Standard Landscape']
+    for Format in (PreviewFormat(), PreviewFormat(CompressionLevel=9), PreviewFormat(True, 1), PreviewFormat(True), PreviewFormat(True, 9)):
+        # The previews are drawn when their benchmarks are first run, which is not timed.
+        Name = f'EncodePreview/{"compact" if Format.Compact else "rgb"}-{"default" if Format.CompressionLevel is None else Format.CompressionLevel}'
+        Benchmarks.append(Benchmark(Name, functools.partial(EncodeCatalogThumbnails, Format), Info=functools.partial(GetEncodeInfo, Format)))
+    for Minified in (False, True):
+        Benchmarks.append(Benchmark(f'GenerateTemplate/{"minified" if Minified else "indented"}', functools.partial(RunGenerateTemplate, Book, Catalog, Minified=Minified), Info=functools.partial(GetTemplateInfo, Book, Catalog, Minified)))
+    GetCatalogs: List[Tuple[str, Callable[[], List[Layout.Entry]]]] = [('catalog', lambda: Catalog), ('catalog-1000', functools.partial(GetSyntheticCatalog, 1000))]
+    for CatalogName, GetCatalog in GetCatalogs:
+        for Renderer in ('pillow', 'numpy'):
+            Benchmarks.append(Benchmark(f'DrawPreviews/{Renderer}/{CatalogName}', functools.partial(DrawCatalogPreviews, Book, GetCatalog, Renderer)))
+    for Count in (1000, 10000):
+        # Synthetic catalogs are enumerated when their benchmarks are first run, which is not timed.
+        Benchmarks.append(Benchmark(f'GenerateGeometry/catalog-{Count}', functools.partial(RunOnSyntheticCatalog, Count, RunGenerateGeometry, Book)))
+        Benchmarks.append(Benchmark(f'GenerateCells/catalog-{Count}', functools.partial(RunOnSyntheticCatalog, Count, RunGenerateCells, Book)))
+        Benchmarks.append(Benchmark(f'OutputTemplateFiles/catalog-{Count}', functools.partial(RunOnSyntheticCatalog, Count, RunOutputTemplateFiles, OutDir, Book), Repeat=1 if 1000 < Count else None))
+    # The gutters between 64 rows would take up more than the whole page.
+    Grid = GetLargeGridCatalog(64)
+    Benchmarks.append(Benchmark('GenerateCells/grid-64x64', functools.partial(RunGenerateCells, Book, Grid, [0])))
+    Benchmarks.append(Benchmark('GenerateTemplate/grid-64x64', functools.partial(RunGenerateTemplate, Book, Grid, [0])))
+    return Benchmarks
+
+
+def Measure(Function: Callable[[], object], Repeat: int) -> Dict:
+    """
+    Time a function.
+    The function is first run once to warm up caches, and to find how many calls are needed for
+    each measurement to take at least 0.2 seconds. The result has the time per call in seconds
+    for each of the Repeat measurements, and statistics over them.
+    """
+    Timer = timeit.Timer(Function)
+    Number, _ = Timer.autorange()
+    Times = [Time / Number for Time in Timer.repeat(repeat=Repeat, number=Number)]
+    return {
+        'number': Number,
+        'repeat': Repeat,
+        'times': Times,
+        'min': min(Times),
+        'median': statistics.median(Times),
+        'mean': statistics.mean(Times),
+        'stdev': statistics.stdev(Times) if 1 < len(Times) else 0.0,
+    }
+
+
+def GetCommit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, check=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def PrintResults(Results: Dict[str, Dict], Baseline: Optional[Dict[str, Dict]]) -> None:
+    NameWidth = max([len('Benchmark')] + [len(Name) for Name in Results])
+    Header = f'{"Benchmark":<{NameWidth}}  {"Median":>10}  {"Min":>10}'
+    if Baseline is not None:
+        Header += f'  {"Baseline":>10}  {"Ratio":>6}'
+    print(Header)
+    for Name, Result in Results.items():
+        Line = f'{Name:<{NameWidth}}  {Result["median"]:>10.4f}  {Result["min"]:>10.4f}'
+        if Baseline is not None:
+            if Name in Baseline:
+                Line += f'  {Baseline[Name]["median"]:>10.4f}  {Result["median"] / Baseline[Name]["median"]:>6.2f}'
+            else:
+                Line += f'  {"-":>10}  {"-":>6}'
+        for Key, Value in Result.get('info', {}).items():
+            Line += f'  {Key}: {Value:.1f}'
+        print(Line)
+
+
+def main() -> None:
+    Parser = argparse.ArgumentParser(description='Benchmark generating layout templates.')
+    Parser.add_argument('-k', '--filter', action='append', help='Only run benchmarks whose name contains this text. Can be given multiple times.')
+    Parser.add_argument('-r', '--repeat', type=int, default=5, help='Number of measurements for each benchmark. Default: 5.')
+    Parser.add_argument('-o', '--output', type=Path, help='Write the results as JSON to this file.')
+    Parser.add_argument('-c', '--compare', type=Path, help='Compare the results with the results in this JSON file, written by an earlier run.')
+    Parser.add_argument('-l', '--log', default='info', choices=['debug', 'info', 'warning', 'error', 'critical'], help='Set the logging level.')
+
+    Args = Parser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=Args.log.upper())
+
+    if Args.repeat < 1:
+        Parser.error('argument -r/--repeat: must be positive')
+
+    Baseline = None
+    if Args.compare is not None:
+        with open(Args.compare) as File:
+            Baseline = {Result['name']: Result for Result in json.load(File)['benchmarks']}
+
+    Results = {}
+    with tempfile.TemporaryDirectory() as OutDir:
+        for Benchmark in GetBenchmarks(Path(OutDir)):
+            if Args.filter and not any(Filter in Benchmark.Name for Filter in Args.filter):
+                continue
+            logging.info(f'Running {Benchmark.Name}.')
+            Results[Benchmark.Name] = Measure(Benchmark.Function, Benchmark.Repeat or Args.repeat)
+            if Benchmark.Info is not None:
+                Results[Benchmark.Name]['info'] = Benchmark.Info()
+
+    PrintResults(Results, Baseline)
+
+    if Args.output is not None:
+        with open(Args.output, 'w') as File:
+            json.dump({
+                'commit': GetCommit(),
+                'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'machine': {
+                    'python': platform.python_version(),
+                    'implementation': platform.python_implementation(),
+                    'platform': platform.platform(),
+                    'processor': platform.processor(),
+                    'cpus': os.cpu_count(),
+                },
+                'parameters': {
+                    'margin': Margins,
+                    'gutter': Gutters,
+                    'ratio': Ratio,
+                },
+                'benchmarks': [dict(name=Name, **Result) for Name, Result in Results.items()],
+            }, File, indent=4)
+            File.write('\n')
+
+
+if __name__ == '__main__':
+    main()
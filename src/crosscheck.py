@@ -0,0 +1,105 @@
+import argparse
+import logging
+import random
+import sys
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+import BatchRaster
+from generate import BookTypes, DrawCells, DrawRectangles, GetImageGutter, GetPageMargin, GetThumbnailDimensions, NewThumbnail, RenderThumbnails
+from Geometry import GenerateGeometry
+import Layout
+from PreviewWriter import PreviewFormat
+
+
+# Margins, gutters and ratios the catalog is drawn with.
+Parameters = [([0], [0], None), ([30, 20], [10], 1.5), ([12], [7], None), ([5, 40, 15], [3, 25], None)]
+
+
+def GetRandomRectangles(Random: random.Random, Size: Tuple[int, int]) -> List[Tuple[int, int, int, int]]:
+    """
+    Get random rectangles, some reaching outside the thumbnail, and some without width or height.
+    """
+    Width, Height = Size
+    Rectangles = []
+    for _ in range(Random.randint(1, 8)):
+        Left = Random.randint(-10, Width + 10)
+        Top = Random.randint(-10, Height + 10)
+        Right = Left + Random.choice([0, 1, 2, Random.randint(0, Width)])
+        Bottom = Top + Random.choice([0, 1, 2, Random.randint(0, Height)])
+        Rectangles.append((Left, Top, Right, Bottom))
+    return Rectangles
+
+
+def DrawWithPillow(Size: Tuple[int, int], Rectangles: List[Tuple[int, int, int, int]]) -> np.ndarray:
+    # Paletted thumbnails are drawn with the palette indices of the NumPy renderer.
+    Thumbnail = NewThumbnail(Size, PreviewFormat(True))
+    DrawRectangles(Thumbnail, Rectangles)
+    return np.asarray(Thumbnail)
+
+
+def CheckRandomRectangles(Count: int, Seed: int) -> int:
+    """
+    Draw random rectangles with both renderers, and get the number of thumbnails that differ.
+    """
+    Random = random.Random(Seed)
+    Sizes = [(Random.randint(1, 60), Random.randint(1, 60)) for _ in range(Count)]
+    Pages = [GetRandomRectangles(Random, Size) for Size in Sizes]
+    Planes = BatchRaster.NewPlanes(Sizes)
+    Layouts = np.array([Idx for Idx, Rectangles in enumerate(Pages) for _ in Rectangles])
+    BatchRaster.DrawRectangles(Planes, Layouts, np.array([Rectangle for Rectangles in Pages for Rectangle in Rectangles]))
+    Errors = 0
+    for Size, Rectangles, Plane in zip(Sizes, Pages, Planes):
+        if not np.array_equal(DrawWithPillow(Size, Rectangles), Plane):
+            Errors += 1
+            logging.error(f'Thumbnails of {Size[0]} x {Size[1]} with {Rectangles} differ.')
+    return Errors
+
+
+def CheckCatalog() -> int:
+    """
+    Draw the layout catalog for all books with both renderers, and get the number of thumbnails
+    that differ.
+    """
+    Catalog = Layout.GetCatalog()
+    Errors = 0
+    for BookName, Book in BookTypes.items():
+        for Margins, Gutters, Ratio in Parameters:
+            PageMargin = GetPageMargin(Book, Margins, Ratio)
+            ImageGutter = GetImageGutter(Gutters)
+            Thumbnails = RenderThumbnails(Book, [Entry.Grid for Entry in Catalog], [Entry.IsDoublePage for Entry in Catalog], PageMargin, ImageGutter, PreviewFormat(True))
+            for Entry, Thumbnail in zip(Catalog, Thumbnails):
+                Dimensions = Book.GetDimensions()
+                if Entry.IsDoublePage:
+                    Dimensions = (Dimensions[0] * 2, Dimensions[1])
+                Expected = NewThumbnail(GetThumbnailDimensions(Dimensions), PreviewFormat(True))
+                DrawCells(Expected, GenerateGeometry(Entry.Grid, Dimensions, PageMargin, ImageGutter), Dimensions)
+                if not np.array_equal(np.asarray(Expected), np.asarray(Thumbnail)):
+                    Errors += 1
+                    logging.error(f'{BookName}, margins {Margins}, gutters {Gutters}, ratio {Ratio}: thumbnails of {Entry.Uuid} differ.')
+    return Errors
+
+
+def main() -> None:
+    Parser = argparse.ArgumentParser(description='Check that the NumPy renderer draws exactly the same preview thumbnails as Pillow.')
+    Parser.add_argument('-n', '--count', type=int, default=10000, help='Number of thumbnails with random rectangles to draw. Default: 10000.')
+    Parser.add_argument('-s', '--seed', type=int, default=0, help='Seed of the random rectangles. Default: 0.')
+    Parser.add_argument('-l', '--log', default='info', choices=['debug', 'info', 'warning', 'error', 'critical'], help='Set the logging level.')
+
+    Args = Parser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=Args.log.upper())
+
+    Start = time.perf_counter()
+    Errors = CheckRandomRectangles(Args.count, Args.seed)
+    logging.info(f'{Args.count} thumbnails with random rectangles, {Errors} differ.')
+    CatalogErrors = CheckCatalog()
+    logging.info(f'{len(BookTypes) * len(Parameters) * len(Layout.GetCatalog())} thumbnails of the layout catalog, {CatalogErrors} differ.')
+    logging.debug(f'Checked in {time.perf_counter() - Start:.1f} seconds.')
+    sys.exit(1 if Errors or CatalogErrors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+import argparse
+import collections
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from generate import BookTypes, GetDefaultName, Slugify
+from Generator import Generator
+
+
+class JobSpec(NamedTuple):
+    Book: str
+    Margins: Tuple[int, ...]
+    Gutters: Tuple[int, ...]
+    Ratio: Optional[float]
+    Name: Optional[str]
+
+
+def ParseJob(Data: Any) -> JobSpec:
+    """
+    Parse and validate a JSON job spec, like {"book": "Small Square", "margin": [12], "gutter": [7],
+    "ratio": 1.5, "name": "My layout templates"}. Only the book is required. Identical jobs give
+    identical specs, so that they can be coalesced and cached.
+    """
+    if not isinstance(Data, dict):
+        raise ValueError('Job must be a JSON object')
+    Unknown = set(Data) - {'book', 'margin', 'gutter', 'ratio', 'name'}
+    if Unknown:
+        raise ValueError(f'Unknown job fields: {", ".join(sorted(Unknown))}')
+
+    Book = Data.get('book')
+    if Book not in BookTypes:
+        raise ValueError(f'Unknown book type "{Book}"')
+
+    def GetNumbers(Field: str, Min: int, Max: int) -> Tuple[int, ...]:
+        Value = Data.get(Field, [0])
+        if isinstance(Value, int):
+            Value = [Value]
+        if not isinstance(Value, list) or not all(isinstance(Number, int) and not isinstance(Number, bool) for Number in Value) or not Min <= len(Value) <= Max:
+            raise ValueError(f'Field "{Field}" must be a list of between {Min} and {Max} integers')
+        return tuple(Value)
+
+    Ratio = Data.get('ratio')
+    if Ratio is not None and (isinstance(Ratio, bool) or not isinstance(Ratio, (int, float)) or Ratio <= 0):
+        raise ValueError('Field "ratio" must be a positive number')
+    Name = Data.get('name')
+    if Name is not None and not isinstance(Name, str):
+        raise ValueError('Field "name" must be a string')
+    return JobSpec(Book, GetNumbers('margin', 1, 4), GetNumbers('gutter', 1, 2), None if Ratio is None else float(Ratio), Name)
+
+
+# Generator of each worker process, created when the worker starts.
+WorkerGenerator: Optional[Generator] = None
+
+
+def InitWorker(CacheSize: int) -> None:
+    global WorkerGenerator
+    WorkerGenerator = Generator(CacheSize)
+
+
+def RunJob(Job: JobSpec) -> bytes:
+    assert WorkerGenerator is not None
+    return WorkerGenerator.GenerateArchive(Job.Book, Job.Margins, Job.Gutters, Job.Ratio, Job.Name).getvalue()
+
+
+class Scheduler:
+    """
+    Run jobs on a pool of worker processes.
+    A job that is identical to a job already running shares its result instead of being run
+    again, and results are kept in memory so that repeated jobs are served without running them.
+    When the results grow larger than MaxSize bytes, the least recently used results are evicted.
+    """
+    def __init__(self, Executor: ProcessPoolExecutor, MaxSize: int) -> None:
+        self.Executor = Executor
+        self.MaxSize = MaxSize
+        self.Size = 0
+        self.Results: 'collections.OrderedDict[JobSpec, bytes]' = collections.OrderedDict()
+        self.Running: Dict[JobSpec, Future] = {}
+        # Reentrant, since a done callback runs immediately on the submitting thread when the job
+        # has already finished.
+        self.Lock = threading.RLock()
+        self.Counts = {'jobs': 0, 'cached': 0, 'coalesced': 0, 'run': 0, 'failed': 0}
+
+    def Submit(self, Job: JobSpec) -> Future:
+        with self.Lock:
+            self.Counts['jobs'] += 1
+            if Job in self.Results:
+                self.Counts['cached'] += 1
+                self.Results.move_to_end(Job)
+                Result: Future = Future()
+                Result.set_result(self.Results[Job])
+                return Result
+            if Job in self.Running:
+                self.Counts['coalesced'] += 1
+                return self.Running[Job]
+            self.Counts['run'] += 1
+            Result = self.Executor.submit(RunJob, Job)
+            self.Running[Job] = Result
+            Result.add_done_callback(lambda Result: self.Finish(Job, Result))
+            return Result
+
+    def Finish(self, Job: JobSpec, Result: Future) -> None:
+        with self.Lock:
+            self.Running.pop(Job, None)
+            if Result.cancelled() or Result.exception() is not None:
+                self.Counts['failed'] += 1
+                return
+            Data = Result.result()
+            if len(Data) <= self.MaxSize:
+                self.Results[Job] = Data
+                self.Size += len(Data)
+            while self.MaxSize < self.Size:
+                self.Size -= len(self.Results.popitem(last=False)[1])
+
+    def GetStatus(self) -> Dict[str, int]:
+        with self.Lock:
+            return dict(self.Counts, running=len(self.Running), results=len(self.Results), size=self.Size)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /generate with a JSON job spec returns the layout template collection as a zip archive.
+    GET /status returns counts of jobs as JSON.
+    """
+    server: 'Server'
+
+    def SendJson(self, Status: int, Data: Any) -> None:
+        Body = json.dumps(Data).encode()
+        self.send_response(Status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(Body)))
+        self.end_headers()
+        self.wfile.write(Body)
+
+    def do_GET(self) -> None:
+        if '/status' != self.path:
+            self.SendJson(404, {'error': f'Unknown path "{self.path}"'})
+            return
+        self.SendJson(200, self.server.Scheduler.GetStatus())
+
+    def do_POST(self) -> None:
+        if '/generate' != self.path:
+            self.SendJson(404, {'error': f'Unknown path "{self.path}"'})
+            return
+        try:
+            Length = int(self.headers.get('Content-Length', 0))
+            Job = ParseJob(json.loads(self.rfile.read(Length)))
+        except ValueError as Error:
+            self.SendJson(400, {'error': str(Error)})
+            return
+
+        try:
+            Data = self.server.Scheduler.Submit(Job).result()
+        except Exception as Error:
+            logging.exception(f'Failed to generate {Job}.')
+            self.SendJson(500, {'error': str(Error)})
+            return
+
+        Name = Job.Name if Job.Name is not None else GetDefaultName(list(Job.Margins), list(Job.Gutters), Job.Ratio)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Disposition', f'attachment; filename="{BookTypes[Job.Book].Name}-{Slugify(Name)}.zip"')
+        self.send_header('Content-Length', str(len(Data)))
+        self.end_headers()
+        self.wfile.write(Data)
+
+    def log_message(self, Format: str, *Args: Any) -> None:
+        logging.debug(f'{self.address_string()} {Format % Args}')
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, Address: Tuple[str, int], Scheduler: Scheduler) -> None:
+        super().__init__(Address, RequestHandler)
+        self.Scheduler = Scheduler
+
+
+def main() -> None:
+    Parser = argparse.ArgumentParser(description='Serve layout template collections over HTTP on localhost.')
+    Parser.add_argument('-p', '--port', type=int, default=8080, help='Port to listen on. Default: 8080.')
+    Parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of worker processes. Default: number of CPUs.')
+    Parser.add_argument('--result-cache-size', type=int, default=256, help='Maximum size of the cache of generated collections in megabytes. Default: 256.')
+    Parser.add_argument('--preview-cache-size', type=int, default=64, help='Maximum size of the preview cache of each worker process in megabytes. Default: 64.')
+    Parser.add_argument('-l', '--log', default='info', choices=['debug', 'info', 'warning', 'error', 'critical'], help='Set the logging level.')
+
+    Args = Parser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=Args.log.upper())
+
+    with ProcessPoolExecutor(max_workers=Args.jobs, initializer=InitWorker, initargs=(Args.preview_cache_size * 1024 * 1024,)) as Executor:
+        # Only listen on the loopback interface, since there is no authentication.
+        with Server(('127.0.0.1', Args.port), Scheduler(Executor, Args.result_cache_size * 1024 * 1024)) as HttpServer:
+            logging.info(f'Listening on http://127.0.0.1:{HttpServer.server_address[1]} with {Args.jobs} workers.')
+            try:
+                HttpServer.serve_forever()
+            except KeyboardInterrupt:
+                pass
+
+
+if __name__ == '__main__':
+    main()
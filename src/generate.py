@@ -1,27 +1,29 @@
+from __future__ import annotations
+
 import argparse
+from collections import Counter
+import functools
+import io
 import logging
 import os
 from pathlib import Path
-from PIL import Image, ImageDraw
-from slugify import slugify
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, TYPE_CHECKING, Union
 import uuid
 
+from Geometry import Cell, GenerateGeometry, Gutter, Margin
+from Install import InstallFiles
 import Layout
+import Lua
+from Manifest import GetHash, GetUuid, Manifest
+from Output import DirOutput, GetOutput, MemoryOutput, Output, ZipOutput
+from PreviewCache import MemoryPreviewCache, PreviewCache
+from PreviewWriter import PreviewFormat, PreviewWriter
+from Profiler import Profiler
 
-
-class Gutter:
-    def __init__(self, Vertical: int, Horizontal: int) -> None:
-        self.Vertical = Vertical
-        self.Horizontal = Horizontal
-
-
-class Margin:
-    def __init__(self, Top: float, Right: float, Bottom: float, Left: float) -> None:
-        self.Top = Top
-        self.Right = Right
-        self.Bottom = Bottom
-        self.Left = Left
+# Pillow, NumPy and slugify take most of the startup time, so they are imported when first used.
+if TYPE_CHECKING:
+    import numpy as np
+    from PIL import Image
 
 
 class BookType:
@@ -52,7 +54,94 @@ BookTypes = {
 }
 
 
+# Buffer size for streaming templatePages.lua to disk.
+WriteBufferSize = 64 * 1024
+
+# Colours of preview thumbnails: background, image fill, image outline and crosshair.
+PreviewColors = ['#FFFFFF', '#8C8C8C', '#959595', '#333333']
+
+# Number of pages whose preview thumbnails are drawn at once by the NumPy renderer.
+RenderBatchSize = 256
+
+# Names of the image transposes giving the preview of a mirrored layout from the preview of its
+# base layout.
+Transposes = {
+    Layout.FlipLeftRight: 'FLIP_LEFT_RIGHT',
+    Layout.FlipTopBottom: 'FLIP_TOP_BOTTOM',
+    Layout.Rotate180: 'ROTATE_180',
+}
+
+# Tables of a cell and of a page in templatePages.lua, with the values that vary as fields.
+CellTable = {
+    'bottomPad': Lua.Field('BottomPad'),
+    'dynamicCellAlignWithPhoto': True,
+    'dynamicCellAutoText': '{{custom_token}}',
+    'dynamicCellPlacement': 'below',
+    'dynamicCellSpacing': 9,
+    'height': 9,
+    'hints': {
+        'photoIndex': Lua.Field('PhotoIndex'),
+    },
+    'leftPad': Lua.Field('LeftPad'),
+    'placeholderType': 'photo',
+    'rightPad': Lua.Field('RightPad'),
+    'topPad': Lua.Field('TopPad'),
+    'transform': {
+        'angle': 0,
+        'height': Lua.Field('Height'),
+        'width': Lua.Field('Width'),
+        'x': Lua.Field('X'),
+        'y': Lua.Field('Y'),
+    },
+    'transformFromCustomPage': {
+        'angle': 0,
+        'height': Lua.Field('Height'),
+        'width': Lua.Field('Width'),
+        'x': Lua.Field('X'),
+        'y': Lua.Field('Y'),
+    },
+    'type': 'PDEImage',
+    'width': 9,
+}
+
+PageTable = ([{
+    'bottomPad': 0,
+    'children': Lua.Block('Cells'),
+    'leftPad': 0,
+    'rightPad': 0,
+    'topPad': 0,
+    'type': 'PDEContainer',
+}], {
+    'hints': {
+        'hintType': 'pageOptions',
+        'pageKey': Lua.Field('PageId'),
+    },
+    'isSpread': Lua.Field('IsSpread'),
+    'name': Lua.Field('Title'),
+    'pageHeight': Lua.Field('PageHeight'),
+    'pageId': Lua.Field('PageId'),
+    'pageWidth': Lua.Field('PageWidth'),
+    'previewName': Lua.Field('PreviewName'),
+    'title': Lua.Field('Title'),
+})
+
+
+class LuaTemplates(NamedTuple):
+    Cell: Lua.Template
+    PageHead: Lua.Template
+    PageTail: Lua.Template
+
+
+@functools.lru_cache(maxsize=None)
+def GetLuaTemplates(Minified: bool = False) -> LuaTemplates:
+    # Cells are indented with spaces, and everything else with tabs.
+    PageHead, PageTail = Lua.Template(Lua.SerializeItem(PageTable, Lua.Style('\t', Minified), 2)).Split('Cells')
+    return LuaTemplates(Lua.Template(Lua.SerializeItem(CellTable, Lua.Style('    ', Minified), 4)), PageHead, PageTail)
+
+
+@functools.lru_cache(maxsize=256)
 def Slugify(Text: str) -> str:
+    from slugify import slugify
     return slugify(Text, to_lower=True)
 
 
@@ -70,200 +159,363 @@ def GetThumbnailCoordinate(Dimensions: Tuple[int, int], Coordinate: int) -> int:
     return int(Coordinate / Ratio)
 
 
-def GenerateCells(Thumbnail: Image, Grid: List[List[Optional[Tuple[int, int]]]], Dimensions: Tuple[int, int], PageMargin: Margin, Gutter: Gutter) -> str:
-    RowCount = len(Grid)
-    assert 0 < RowCount
-    ColCount = len(Grid[0])
-
-    CellHeight = (Dimensions[1] - PageMargin.Top - PageMargin.Bottom - (RowCount-1) * Gutter.Vertical) / RowCount
-    CellWidth = (Dimensions[0] - PageMargin.Left - PageMargin.Right - (ColCount-1) * Gutter.Horizontal) / ColCount
-
-    Cells = ''
-    CellIdx = 0
-    PosY = Dimensions[1] - PageMargin.Top
-    for RowIdx, Row in enumerate(Grid):
-        assert len(Row) == ColCount
-        PosX = PageMargin.Left
-        for ColIdx, Cell in enumerate(Row):
-            if Cell is not None:
-                assert 0 < Cell[0]
-                assert 0 < Cell[1]
-                assert ColIdx + Cell[0] <= ColCount
-                assert RowIdx + Cell[1] <= RowCount
-
-                Padding = Margin(0, 0, 0, 0)
-
-                if 0 < RowIdx:
-                    Padding.Top = Gutter.Vertical / 2
-                if ColIdx + Cell[0] < ColCount:
-                    Padding.Right = Gutter.Horizontal / 2
-                if RowIdx + Cell[1] < RowCount:
-                    Padding.Bottom = Gutter.Vertical / 2
-                if 0 < ColIdx:
-                    Padding.Left = Gutter.Horizontal / 2
-
-                Width = Padding.Left + CellWidth + Padding.Right + (CellWidth + Gutter.Horizontal) * (Cell[0] - 1)
-                Height = Padding.Bottom + CellHeight + Padding.Top + (CellHeight + Gutter.Vertical) * (Cell[1] - 1)
-                if Height < 0:
-                    logging.error('Cell height is negative.')
-                elif Width < 0:
-                    logging.error('Cell width is negative.')
-
-                Draw = ImageDraw.Draw(Thumbnail)
-                Left = GetThumbnailCoordinate(Dimensions, int(PosX + Padding.Left))
-                Top = GetThumbnailCoordinate(Dimensions, int(Dimensions[1] - PosY + Padding.Top))
-                Right = GetThumbnailCoordinate(Dimensions, int(PosX + Width - Padding.Right))
-                Bottom = GetThumbnailCoordinate(Dimensions, int(Dimensions[1] - PosY + Height - Padding.Bottom))
-                Draw.rectangle([Left, Top, Right, Bottom], fill='#8C8C8C', outline='#959595', width=1)
-                HorizontalCenter = int((Right - Left) / 2 + Left)
-                VerticalCenter = int((Bottom - Top) / 2 + Top)
-                CrosshairSize = 3
-                Draw.line([HorizontalCenter, VerticalCenter - CrosshairSize, HorizontalCenter, VerticalCenter + CrosshairSize], fill='#333333', width=1)
-                Draw.line([HorizontalCenter - CrosshairSize, VerticalCenter, HorizontalCenter + CrosshairSize, VerticalCenter], fill='#333333', width=1)
-
-                CellIdx += 1
-                Cells += f'''\
-                {{
-                    bottomPad = {Padding.Bottom},
-                    dynamicCellAlignWithPhoto = true,
-                    dynamicCellAutoText = "{{{{custom_token}}}}",
-                    dynamicCellPlacement = "below",
-                    dynamicCellSpacing = 9,
-                    height = 9,
-                    hints = {{
-                        photoIndex = {CellIdx},
-                    }},
-                    leftPad = {Padding.Left},
-                    placeholderType = "photo",
-                    rightPad = {Padding.Right},
-                    topPad = {Padding.Top},
-                    transform = {{
-                        angle = 0,
-                        height = {Height},
-                        width = {Width},
-                        x = {PosX},
-                        y = {PosY - Height},
-                    }},
-                    transformFromCustomPage = {{
-                        angle = 0,
-                        height = {Height},
-                        width = {Width},
-                        x = {PosX},
-                        y = {PosY - Height},
-                    }},
-                    type = "PDEImage",
-                    width = 9,
-                }},
-'''
-            if 0 < ColIdx:
-                PosX += Gutter.Horizontal / 2
-            PosX += CellWidth + Gutter.Horizontal / 2
-        if 0 < RowIdx:
-            PosY -= Gutter.Vertical / 2
-        PosY -= CellHeight + Gutter.Vertical / 2
-    return Cells
-
-
-def GenerateTemplate(OutDir: Path, Book: BookType, LayoutName: str, PageUuid: str, Grid: List[List[Optional[Tuple[int, int]]]], Margin: Margin, Gutter: Gutter, IsDoublePage: bool = False) -> str:
-    Dimensions = Book.GetDimensions()
-    if IsDoublePage:
-        Dimensions = (Dimensions[0] * 2, Dimensions[1])
-
-    Thumbnail = Image.new('RGB', GetThumbnailDimensions(Dimensions), 'white')
-
-    Cells = GenerateCells(Thumbnail, Grid, Dimensions, Margin, Gutter)
-
-    Thumbnail.save(f'{OutDir}/{Book.Name}/{Slugify(LayoutName)}/{PageUuid}_preview.png')
-
-    return f'''\
-		{{
-			{{
-				bottomPad = 0,
-				children = {{
-{Cells}
-				}},
-				leftPad = 0,
-				rightPad = 0,
-				topPad = 0,
-				type = "PDEContainer",
-			}},
-			hints = {{
-				hintType = "pageOptions",
-				pageKey = "{Book.Name}_{Slugify(LayoutName)}_{PageUuid}",
-			}},
-			isSpread = {str(IsDoublePage).lower()},
-			name = "{LayoutName}_{PageUuid}",
-			pageHeight = {Dimensions[1]},
-			pageId = "{Book.Name}_{Slugify(LayoutName)}_{PageUuid}",
-			pageWidth = {Dimensions[0]},
-			previewName = "{PageUuid}_preview.png",
-			title = "{LayoutName}_{PageUuid}",
-		}},
-'''
-
-
-def OutputTemplateFiles(OutDir: Path, Book: BookType, LayoutName: str, Margin: Margin, Gutter: Gutter) -> None:
-    Path(f'{OutDir}/{Book.Name}/{Slugify(LayoutName)}').mkdir(exist_ok=True)
-    File = open(f'{OutDir}/{Book.Name}/{Slugify(LayoutName)}/templatePages.lua', 'w')
-
-    PaperUuid = uuid.uuid4()
-
-    Templates = ''
-    for PageUuid, Grid in Layout.GetSinglePages():
-        Templates += GenerateTemplate(OutDir, Book, LayoutName, PageUuid, Grid, Margin, Gutter)
-    for PageUuid, Grid in Layout.GetDoublePages():
-        Templates += GenerateTemplate(OutDir, Book, LayoutName, PageUuid, Grid, Margin, Gutter, IsDoublePage=True)
-
-    File.write(f'''\
-pages = {{
-	actualBookHeight = {Book.GetDimensions()[1]},
-	actualBookWidth = {Book.GetDimensions()[0]},
-	backgrounds = {{
-	}},
-	bookHeight = {Book.GetDimensions()[1]},
-	bookWidth = {Book.GetDimensions()[0]},
-	covers = {{
-		hardcover_imagewrap = {{
-		}},
-		hardcover_jacket = {{
-		}},
-		softcover = {{
-		}},
-	}},
-	hints = {{
-		bookTitle = "{LayoutName}",
-		hintType = "bookOptions",
-		paperId = "{Book.Name}",
-		styleName = "{Slugify(LayoutName)}",
-	}},
-	pages = {{
-{Templates}
-	}},
-	paperId = "{PaperUuid}",
-}}
-''')
-
-
-def OutputLayoutFile(OutDir: Path, Book: BookType, LayoutName: str) -> None:
-    LayoutUuid = uuid.uuid4()
-    TemplateUuid = uuid.uuid4()
-    Path(f'{OutDir}/{Book.Name}').mkdir(exist_ok=True)
-    File = open(f'{OutDir}/{Book.Name}/{Slugify(LayoutName)}.lrtemplate', 'w')
-    File.write(f'''\
-s = {{
-	id = "{LayoutUuid}",
-	internalName = "{Book.Name}_{Slugify(LayoutName)}",
-	title = "{LayoutName}",
-	type = "layoutStyle",
-	value = {{
-		paperId = "{Book.Name}",
-		resources = "{Slugify(LayoutName)}",
-		styleName = "{Slugify(LayoutName)}",
-		templateId = "{TemplateUuid}",
-	}},
-	version = 0,
-}}
-''')
+def GetThumbnailRectangles(Cells: List[Cell], Dimensions: Tuple[int, int]) -> List[Tuple[int, int, int, int]]:
+    Rectangles = []
+    for Cell in Cells:
+        Left = GetThumbnailCoordinate(Dimensions, int(Cell.X + Cell.LeftPad))
+        Top = GetThumbnailCoordinate(Dimensions, int(Dimensions[1] - Cell.Y + Cell.TopPad))
+        Right = GetThumbnailCoordinate(Dimensions, int(Cell.X + Cell.Width - Cell.RightPad))
+        Bottom = GetThumbnailCoordinate(Dimensions, int(Dimensions[1] - Cell.Y + Cell.Height - Cell.BottomPad))
+        Rectangles.append((Left, Top, Right, Bottom))
+    return Rectangles
+
+
+def MirrorRectangles(Rectangles: List[Tuple[int, int, int, int]], Dimensions: Tuple[int, int], Transform: str) -> List[Tuple[int, int, int, int]]:
+    """
+    Get the rectangles of a thumbnail with the given dimensions after transposing it by Transform.
+    """
+    Width, Height = Dimensions
+    Mirrored = []
+    for Left, Top, Right, Bottom in Rectangles:
+        if Transform in (Layout.FlipLeftRight, Layout.Rotate180):
+            Left, Right = Width - 1 - Right, Width - 1 - Left
+        if Transform in (Layout.FlipTopBottom, Layout.Rotate180):
+            Top, Bottom = Height - 1 - Bottom, Height - 1 - Top
+        Mirrored.append((Left, Top, Right, Bottom))
+    return Mirrored
+
+
+def IsMirroredPreview(BaseRectangles: List[Tuple[int, int, int, int]], Rectangles: List[Tuple[int, int, int, int]], Dimensions: Tuple[int, int], Transform: str) -> bool:
+    """
+    Get whether transposing the preview drawn from BaseRectangles by Transform gives exactly the
+    preview drawn from Rectangles.
+    Crosshairs are drawn at the truncated centers of the rectangles, so they are only mirrored onto
+    the centers of the mirrored rectangles when the rectangles are an even number of pixels across
+    the mirror axis. Pillow draws the sides of rectangles without height one pixel below them, so
+    those cannot be flipped top to bottom.
+    """
+    if sorted(MirrorRectangles(BaseRectangles, Dimensions, Transform)) != sorted(Rectangles):
+        return False
+    for Left, Top, Right, Bottom in Rectangles:
+        if Transform in (Layout.FlipLeftRight, Layout.Rotate180) and (Right - Left) % 2:
+            return False
+        if Transform in (Layout.FlipTopBottom, Layout.Rotate180) and ((Bottom - Top) % 2 or Top == Bottom):
+            return False
+    return True
+
+
+def NewThumbnail(Dimensions: Tuple[int, int], Format: PreviewFormat = PreviewFormat()) -> Image.Image:
+    from PIL import Image, ImageColor
+    if Format.Compact:
+        Thumbnail = Image.new('P', Dimensions, PreviewColors.index('#FFFFFF'))
+        Thumbnail.putpalette([Channel for Color in PreviewColors for Channel in ImageColor.getrgb(Color)])
+        return Thumbnail
+    return Image.new('RGB', Dimensions, 'white')
+
+
+def GetInk(Thumbnail: Image.Image, Color: str) -> Union[int, str]:
+    # Paletted thumbnails are drawn with palette indices, since older versions of Pillow cannot
+    # look up colours in the palette.
+    if 'P' == Thumbnail.mode:
+        return PreviewColors.index(Color)
+    return Color
+
+
+def DrawRectangles(Thumbnail: Image.Image, Rectangles: List[Tuple[int, int, int, int]]) -> None:
+    from PIL import ImageDraw
+    Draw = ImageDraw.Draw(Thumbnail)
+    Fill = GetInk(Thumbnail, '#8C8C8C')
+    Outline = GetInk(Thumbnail, '#959595')
+    Crosshair = GetInk(Thumbnail, '#333333')
+    for Left, Top, Right, Bottom in Rectangles:
+        Draw.rectangle([Left, Top, Right, Bottom], fill=Fill, outline=Outline, width=1)
+        HorizontalCenter = int((Right - Left) / 2 + Left)
+        VerticalCenter = int((Bottom - Top) / 2 + Top)
+        CrosshairSize = 3
+        Draw.line([HorizontalCenter, VerticalCenter - CrosshairSize, HorizontalCenter, VerticalCenter + CrosshairSize], fill=Crosshair, width=1)
+        Draw.line([HorizontalCenter - CrosshairSize, VerticalCenter, HorizontalCenter + CrosshairSize, VerticalCenter], fill=Crosshair, width=1)
+
+
+def DrawCells(Thumbnail: Image.Image, Cells: List[Cell], Dimensions: Tuple[int, int]) -> None:
+    DrawRectangles(Thumbnail, GetThumbnailRectangles(Cells, Dimensions))
+
+
+def GetPlaneThumbnail(Plane: np.ndarray, Format: PreviewFormat = PreviewFormat()) -> Image.Image:
+    Thumbnail = NewThumbnail((Plane.shape[1], Plane.shape[0]), PreviewFormat(True))
+    Thumbnail.frombytes(Plane.tobytes())
+    return Thumbnail if Format.Compact else Thumbnail.convert('RGB')
+
+
+def RenderThumbnails(Book: BookType, Grids: Sequence[Union[Layout.SparseGrid, List[List[Optional[Tuple[int, int]]]]]], IsDoublePage: Sequence[bool], PageMargin: Margin, Gutter: Gutter, Format: PreviewFormat = PreviewFormat()) -> List[Image.Image]:
+    """
+    Draw the preview thumbnails of many pages at once with NumPy, instead of drawing the cells of
+    each page with ImageDraw. The thumbnails are identical to those drawn by DrawCells.
+    """
+    import numpy as np
+    from BatchGeometry import GenerateBatchGeometry, GetParameters, Placements
+    import BatchRaster
+    if not Grids:
+        return []
+    PagePlacements = Placements(Grids, IsDoublePage)
+    Cells = GenerateBatchGeometry(PagePlacements, *GetParameters([(Book.GetDimensions(), PageMargin, Gutter)]))
+    Dimensions = [(Book.Width * 2, Book.Height) if Double else Book.GetDimensions() for Double in IsDoublePage]
+    PageHeights = np.array([PageDimensions[1] for PageDimensions in Dimensions])
+    Ratios = np.array([GetThumbnailRatio(PageDimensions) for PageDimensions in Dimensions])
+    Rectangles = BatchRaster.GetThumbnailRectangles(PagePlacements, Cells, PageHeights, Ratios)
+    Planes = BatchRaster.NewPlanes([GetThumbnailDimensions(PageDimensions) for PageDimensions in Dimensions])
+    BatchRaster.DrawRectangles(Planes, PagePlacements.Layout, Rectangles)
+    return [GetPlaneThumbnail(Plane, Format) for Plane in Planes]
+
+
+def GenerateCellTemplates(Cells: List[Cell], Minified: bool = False) -> Iterator[str]:
+    Template = GetLuaTemplates(Minified).Cell
+    Style = Lua.Style(Minified=Minified)
+    Number = Style.GetNumberFormatter()
+    for CellIdx, Cell in enumerate(Cells, 1):
+        if CellIdx > 1:
+            yield Style.GetItemSeparator()
+        yield Template.Render({
+            'BottomPad': Number(Cell.BottomPad),
+            'PhotoIndex': Number(CellIdx),
+            'LeftPad': Number(Cell.LeftPad),
+            'RightPad': Number(Cell.RightPad),
+            'TopPad': Number(Cell.TopPad),
+            'Height': Number(Cell.Height),
+            'Width': Number(Cell.Width),
+            'X': Number(Cell.X),
+            'Y': Number(Cell.Y - Cell.Height),
+        })
+
+
+def GenerateCells(Thumbnail: Image.Image, Grid: Union[Layout.SparseGrid, List[List[Optional[Tuple[int, int]]]]], Dimensions: Tuple[int, int], PageMargin: Margin, Gutter: Gutter) -> str:
+    Cells = GenerateGeometry(Grid, Dimensions, PageMargin, Gutter)
+    DrawCells(Thumbnail, Cells, Dimensions)
+    return ''.join(GenerateCellTemplates(Cells))
+
+
+def GetPreviewName(PageUuid: str) -> str:
+    return f'{PageUuid}_preview.png'
+
+
+def IsMirrorSymmetric(PageMargin: Margin, Transform: str) -> bool:
+    if Transform == Layout.FlipLeftRight:
+        return PageMargin.Left == PageMargin.Right
+    if Transform == Layout.FlipTopBottom:
+        return PageMargin.Top == PageMargin.Bottom
+    return PageMargin.Left == PageMargin.Right and PageMargin.Top == PageMargin.Bottom
+
+
+def WritePreview(Out: Output, Book: BookType, LayoutName: str, PageUuid: str, Cells: List[Cell], Dimensions: Tuple[int, int], Margin: Margin, Writer: PreviewWriter, Cache: Optional[Union[PreviewCache, MemoryPreviewCache]] = None, Variant: Optional[Layout.Mirror] = None, Thumbnails: Optional[Dict[str, Optional[Tuple[Image.Image, List[Tuple[int, int, int, int]]]]]] = None, Drawn: Optional[Image.Image] = None) -> None:
+    """
+    Write the preview of a page, from the cache, mirrored from the preview of its base layout, as
+    already drawn, or drawn now.
+    Previews of the layouts in Thumbnails are kept there for deriving the previews of their mirror
+    images.
+    """
+    from PIL import Image
+    Profile = Writer.Profile
+    # Previews in other formats than the default must not replace default previews in the cache.
+    Format = None if PreviewFormat() == Writer.Format else Writer.Format
+    ThumbnailDimensions = GetThumbnailDimensions(Dimensions)
+    Rectangles = GetThumbnailRectangles(Cells, Dimensions)
+    PreviewName = f'{Book.Name}/{Slugify(LayoutName)}/{GetPreviewName(PageUuid)}'
+    # The preview of a mirrored layout is the mirrored preview of its base layout, and does not
+    # have to be drawn, when that gives exactly the same preview. With common margins and
+    # gutters, this is the case for about one in seven mirror images.
+    Mirrored = None
+    if Variant is not None and Thumbnails is not None and IsMirrorSymmetric(Margin, Variant.Transform):
+        Base = Thumbnails.get(Variant.Base)
+        if Base is not None and IsMirroredPreview(Base[1], Rectangles, ThumbnailDimensions, Variant.Transform):
+            Mirrored = (Base[0], Variant.Transform)
+    Key = PreviewCache.GetKey(ThumbnailDimensions, Rectangles, Format)
+    with Profile.Stage('write', PageUuid):
+        Cached = None if Cache is None else Cache.Fetch(Key)
+        if Cached is not None:
+            Out.Write(PreviewName, Cached)
+            if Thumbnails is not None and PageUuid in Thumbnails:
+                Thumbnails[PageUuid] = (Image.open(io.BytesIO(Cached)), Rectangles)
+    if Cached is None:
+        with Profile.Stage('draw', PageUuid):
+            if Mirrored is not None:
+                Thumbnail = Mirrored[0].transpose(getattr(Image, Transposes[Mirrored[1]]))
+            elif Drawn is not None:
+                Thumbnail = Drawn
+            else:
+                Thumbnail = NewThumbnail(ThumbnailDimensions, Writer.Format)
+                DrawRectangles(Thumbnail, Rectangles)
+        if Thumbnails is not None and PageUuid in Thumbnails:
+            Thumbnails[PageUuid] = (Thumbnail, Rectangles)
+        Writer.Write(Thumbnail, Out, PreviewName, None if Cache is None else lambda Data: Cache.Store(Key, Data), Page=PageUuid)
+
+
+def GenerateTemplate(Book: BookType, LayoutName: str, PageUuid: str, Cells: List[Cell], Dimensions: Tuple[int, int], IsDoublePage: bool = False, Minified: bool = False) -> Iterator[str]:
+    """
+    Generate the Lua code of a page with the given cells, in chunks.
+    """
+    Templates = GetLuaTemplates(Minified)
+    Style = Lua.Style(Minified=Minified)
+    Id = Lua.Quote(f'{Book.Name}_{Slugify(LayoutName)}_{PageUuid}')
+    Title = Lua.Quote(f'{LayoutName}_{PageUuid}')
+    yield Templates.PageHead.Render({})
+    yield from GenerateCellTemplates(Cells, Minified)
+    yield Templates.PageTail.Render({
+        'PageId': Id,
+        'IsSpread': Lua.Serialize(IsDoublePage, Style),
+        'Title': Title,
+        'PageHeight': Lua.Serialize(Dimensions[1], Style),
+        'PageWidth': Lua.Serialize(Dimensions[0], Style),
+        'PreviewName': Lua.Quote(GetPreviewName(PageUuid)),
+    })
+
+
+def GetFileTemplates(Book: BookType, LayoutName: str, PaperUuid: Union[str, uuid.UUID], Minified: bool = False) -> Tuple[str, str]:
+    """
+    Get the code of templatePages.lua before and after the pages.
+    """
+    Style = Lua.Style('\t', Minified)
+    Width, Height = Book.GetDimensions()
+    Code = Lua.Serialize({
+        'actualBookHeight': Height,
+        'actualBookWidth': Width,
+        'backgrounds': {},
+        'bookHeight': Height,
+        'bookWidth': Width,
+        'covers': {
+            'hardcover_imagewrap': {},
+            'hardcover_jacket': {},
+            'softcover': {},
+        },
+        'hints': {
+            'bookTitle': LayoutName,
+            'hintType': 'bookOptions',
+            'paperId': Book.Name,
+            'styleName': Slugify(LayoutName),
+        },
+        'pages': Lua.Block('Pages'),
+        'paperId': str(PaperUuid),
+    }, Style)
+    Head, Tail = Lua.Template(f'pages{"=" if Minified else " = "}{Code}\n').Split('Pages')
+    return Head.Render({}), Tail.Render({})
+
+
+def OutputTemplateFiles(OutDir: Union[Path, Output], Book: BookType, LayoutName: str, Margin: Margin, Gutter: Gutter, Cache: Optional[Union[PreviewCache, MemoryPreviewCache]] = None, Incremental: bool = False, Threads: int = 0, Catalog: Optional[Sequence[Layout.Entry]] = None, Profile: Optional[Profiler] = None, Format: PreviewFormat = PreviewFormat(), Renderer: str = 'pillow', Previews: bool = True, StableIds: bool = False, Minified: bool = False) -> None:
+    """
+    Output templatePages.lua and the preview thumbnails of a layout template collection.
+    The previews are drawn one page at a time with Pillow, or with the 'numpy' renderer in batches
+    of pages. Without previews, only templatePages.lua is written. IDs are deterministic in
+    incremental mode or with StableIds. Minified writes templatePages.lua without indentation and
+    line breaks.
+    """
+    if Profile is None:
+        Profile = Profiler()
+
+    Out = GetOutput(OutDir, WriteBufferSize)
+    Dir = f'{Book.Name}/{Slugify(LayoutName)}'
+    Out.MakeDir(Dir)
+
+    if Catalog is None:
+        Catalog = Layout.GetCatalog()
+    Pages = [(Entry.Uuid, Entry.Grid, Entry.IsDoublePage, Entry.Variant) for Entry in Catalog]
+    # Previews of the layouts that other layouts are mirror images of are kept until the last of
+    # the mirror images has been generated.
+    Variants = Counter(Entry.Variant.Base for Entry in Catalog if Entry.Variant is not None)
+    Thumbnails: Dict[str, Optional[Tuple[Image.Image, List[Tuple[int, int, int, int]]]]] = dict.fromkeys(Variants)
+
+    if Incremental or StableIds:
+        PaperUuid = GetUuid('paper', Book.Name, LayoutName, vars(Margin), vars(Gutter))
+    else:
+        PaperUuid = uuid.uuid4()
+
+    PageManifest = None
+    if Incremental:
+        Inputs = {PageUuid: GetHash(Book.Name, Book.GetDimensions(), LayoutName, PageUuid, Grid.RowCount, Grid.ColCount, list(Grid), IsDoublePage, vars(Margin), vars(Gutter), list(Format)) for PageUuid, Grid, IsDoublePage, _ in Pages}
+        Collection = GetHash(str(PaperUuid), Inputs)
+        # Pages are not recorded in the manifest when their previews are skipped, but the
+        # collection must not be current for later runs writing previews either.
+        if not Previews:
+            Collection = GetHash(Collection, 'no previews')
+        if Minified:
+            Collection = GetHash(Collection, 'minified')
+        if not isinstance(Out, DirOutput):
+            raise ValueError('Incremental mode requires output to a directory')
+        PageManifest = Manifest(Out.Dir / Dir)
+        if PageManifest.IsCollectionCurrent(Collection):
+            logging.debug(f'Layout templates in "{Out.Dir / Dir}" are up to date.')
+            return
+
+    with Out.Open(f'{Dir}/templatePages.lua') as File:
+        Head, Tail = GetFileTemplates(Book, LayoutName, PaperUuid, Minified)
+        File.write(Head)
+        Rendered = []
+        # Pages are separated once the first one is written.
+        Separator, PageSeparator = '', Lua.Style(Minified=Minified).GetItemSeparator()
+        with PreviewWriter(Threads, Profile, Format) as Writer:
+            for Start in range(0, len(Pages), RenderBatchSize):
+                Batch = [(PageUuid, Grid, IsDoublePage, Variant, Previews and (PageManifest is None or not PageManifest.IsPageCurrent(PageUuid, Inputs[PageUuid]))) for PageUuid, Grid, IsDoublePage, Variant in Pages[Start:Start + RenderBatchSize]]
+                Drawn: Dict[str, Image.Image] = {}
+                if 'numpy' == Renderer:
+                    Draw = [(PageUuid, Grid, IsDoublePage) for PageUuid, Grid, IsDoublePage, Variant, Preview in Batch if Preview]
+                    with Profile.Stage('draw'):
+                        Drawn = dict(zip([Page[0] for Page in Draw], RenderThumbnails(Book, [Page[1] for Page in Draw], [Page[2] for Page in Draw], Margin, Gutter, Format)))
+                for PageUuid, Grid, IsDoublePage, Variant, Preview in Batch:
+                    Dimensions = Book.GetDimensions()
+                    if IsDoublePage:
+                        Dimensions = (Dimensions[0] * 2, Dimensions[1])
+                    with Profile.Stage('geometry', PageUuid):
+                        Cells = GenerateGeometry(Grid, Dimensions, Margin, Gutter)
+                    if Preview:
+                        WritePreview(Out, Book, LayoutName, PageUuid, Cells, Dimensions, Margin, Writer, Cache=Cache, Variant=Variant, Thumbnails=Thumbnails, Drawn=Drawn.pop(PageUuid, None))
+                    with Profile.Stage('lua', PageUuid):
+                        Template = ''.join(GenerateTemplate(Book, LayoutName, PageUuid, Cells, Dimensions, IsDoublePage, Minified))
+                    with Profile.Stage('write', PageUuid):
+                        File.write(Separator + Template)
+                    Separator = PageSeparator
+                    if Preview:
+                        Rendered.append(PageUuid)
+                    if Variant is not None:
+                        Variants[Variant.Base] -= 1
+                        if 0 == Variants[Variant.Base]:
+                            del Thumbnails[Variant.Base]
+            # All previews must be written before templatePages.lua is completed.
+            Writer.Wait()
+        if PageManifest is not None:
+            for PageUuid in Rendered:
+                PageManifest.SetPage(PageUuid, Inputs[PageUuid], GetPreviewName(PageUuid))
+        File.write(Tail)
+
+    if PageManifest is not None:
+        PageManifest.SetFile('templatePages.lua')
+        PageManifest.RemoveStalePages(set(Inputs))
+        PageManifest.Save(Collection)
+
+
+def OutputLayoutFile(OutDir: Union[Path, Output], Book: BookType, LayoutName: str, Incremental: bool = False) -> None:
+    if Incremental:
+        LayoutUuid = GetUuid('layout', Book.Name, LayoutName)
+        TemplateUuid = GetUuid('template', Book.Name, LayoutName)
+    else:
+        LayoutUuid = uuid.uuid4()
+        TemplateUuid = uuid.uuid4()
+    Out = GetOutput(OutDir)
+    Out.MakeDir(Book.Name)
+    Name = f'{Book.Name}/{Slugify(LayoutName)}.lrtemplate'
+    Content = 's = ' + Lua.Serialize({
+        'id': str(LayoutUuid),
+        'internalName': f'{Book.Name}_{Slugify(LayoutName)}',
+        'title': LayoutName,
+        'type': 'layoutStyle',
+        'value': {
+            'paperId': Book.Name,
+            'resources': Slugify(LayoutName),
+            'styleName': Slugify(LayoutName),
+            'templateId': str(TemplateUuid),
+        },
+        'version': 0,
+    }) + '\n'
+    if Incremental and Out.Read(Name) == Content.encode():
+        return
+    with Out.Open(Name) as File:
+        File.write(Content)
 
 
 def GetLengthValidator(Min: int, Max: int):
@@ -282,60 +534,133 @@ class DirValidator(argparse.Action):
         setattr(Namespace, self.dest, Value)
 
 
-def ListToCsv(Values: List[str]) -> str:
+def ListToCsv(Values: Sequence[object]) -> str:
     Csv = ''
     for Value in Values:
         Csv += f'{Value},'
     return Csv[:-1]
 
 
+def GetDefaultName(Margins: List[int], Gutters: List[int], Ratio: Optional[float]) -> str:
+    Name = f'Margin {ListToCsv(Margins)}, gutter {ListToCsv(Gutters)}'
+    if Ratio is not None:
+        Name += f', ratio {Ratio}'
+    return Name
+
+
+def GetPageMargin(Book: BookType, Margins: List[int], Ratio: Optional[float]) -> Margin:
+    Margins = list(Margins)
+    if 1 == len(Margins):
+        Margins.append(Margins[0])
+    if 2 == len(Margins):
+        Margins.append(Margins[0])
+    if 3 == len(Margins):
+        Margins.append(Margins[1])
+    PageMargin = Margin(Margins[0], Margins[1], Margins[2], Margins[3])
+
+    if Ratio is not None:
+        Width = Book.GetDimensions()[0] - PageMargin.Left - PageMargin.Right
+        Height = Book.GetDimensions()[1] - PageMargin.Top - PageMargin.Bottom
+        if Width <= 0 or Height <= 0:
+            raise ValueError(f'Margins leave no room for content with ratio {Ratio}')
+        if Width / Height < Ratio:
+            Diff = Height - Width / Ratio
+            PageMargin.Top += Diff / 2
+            PageMargin.Bottom += Diff / 2
+        else:
+            Diff = Width - Height * Ratio
+            PageMargin.Left += Diff / 2
+            PageMargin.Right += Diff / 2
+
+    return PageMargin
+
+
+def GetImageGutter(Gutters: List[int]) -> Gutter:
+    Gutters = list(Gutters)
+    if 1 == len(Gutters):
+        Gutters.append(Gutters[0])
+    return Gutter(Gutters[0], Gutters[1])
+
+
+def GetPreviewCache(Dir: Optional[Path], MaxSize: int) -> Optional[PreviewCache]:
+    if Dir is None:
+        return None
+    Dir.mkdir(parents=True, exist_ok=True)
+    return PreviewCache(Dir, MaxSize * 1024 * 1024)
+
+
 def main() -> None:
     Parser = argparse.ArgumentParser(description='Generate layout templates for the Lightroom Book module.')
     Parser.add_argument('book', choices=BookTypes.keys(), help='Book to generate layout templates for.')
     Parser.add_argument('-o', '--outdir', type=Path, default=os.getcwd(), action=DirValidator, help='Output directory for the template files. Default: current working directory.')
+    Parser.add_argument('-a', '--archive', type=Path, help='Write the template files into this zip archive instead of the output directory.')
     Parser.add_argument('-n', '--name', type=str, help='Name for the generated set of layout templates.')
     Parser.add_argument('-m', '--margin', type=int, nargs='+', default=[0], action=GetLengthValidator(1, 4), help='Margin on pages. Two numbers set vertical and horizontal margins separately. Three numbers set top, horizontal, and bottom margins separately. Four numbers set top, right, bottom, and left margins separately.')
     Parser.add_argument('-g', '--gutter', type=int, nargs='+', default=[0], action=GetLengthValidator(1, 2), help='Gutter between images. Two numbers set vertical and horizontal gutters separately.')
     Parser.add_argument('-r', '--ratio', type=float, help='Desired ratio between width and height of content on page.')
+    Parser.add_argument('--preview-cache', type=Path, help='Directory for caching preview thumbnails between runs. Default: no caching.')
+    Parser.add_argument('--preview-cache-size', type=int, default=64, help='Maximum size of the preview cache in megabytes. Default: 64.')
+    Parser.add_argument('-t', '--threads', type=int, default=0, help='Number of threads for encoding and writing preview thumbnails. Default: 0, writing them on the main thread.')
+    Parser.add_argument('--compact-previews', action='store_true', help='Write preview thumbnails as paletted images, which are about half the size.')
+    Parser.add_argument('--compression-level', type=int, choices=range(10), metavar='{0-9}', help='Compression level of preview thumbnails, from 0 (none) to 9 (smallest). Default: 6.')
+    Parser.add_argument('--no-previews', action='store_true', help='Do not write preview thumbnails, for example when they already exist.')
+    Parser.add_argument('--minify-lua', action='store_true', help='Write templatePages.lua without indentation and line breaks, which makes it less than half the size.')
+    Parser.add_argument('--renderer', default='pillow', choices=['pillow', 'numpy'], help='Renderer for preview thumbnails: Pillow, drawing one page at a time, or NumPy, drawing many pages at once. Both draw identical previews. Default: pillow.')
+    Parser.add_argument('--install', action='store_true', help='Install the template files into the output directory, only writing files that have changed, and replacing each collection of layout templates at once. Uses deterministic IDs.')
+    Parser.add_argument('-i', '--incremental', action='store_true', help='Only regenerate layout templates whose inputs have changed since the last run, and use deterministic IDs.')
+    Parser.add_argument('--profile', action='store_true', help='Print the time, number of calls and peak memory of each stage of the generation.')
+    Parser.add_argument('--profile-output', type=Path, help='Write the profile to this file. Implies --profile.')
+    Parser.add_argument('--profile-format', default='json', choices=['json', 'chrome'], help='Format of the profile file: JSON with a summary per stage and page, or Chrome trace events. Default: json.')
     Parser.add_argument('-l', '--log', default='info', choices=['debug', 'info', 'warning', 'error', 'critical'], help='Set the logging level.')
 
     Args = Parser.parse_args()
 
     logging.basicConfig(format='%(levelname)s: %(message)s', level=Args.log.upper())
 
+    if Args.archive is not None and Args.incremental:
+        Parser.error('argument -i/--incremental: not allowed with argument -a/--archive')
+    if Args.install:
+        for Argument, Name in ((Args.archive is not None, '-a/--archive'), (Args.incremental, '-i/--incremental'), (Args.no_previews, '--no-previews')):
+            if Argument:
+                Parser.error(f'argument --install: not allowed with argument {Name}')
+
     Book = BookTypes[Args.book]
 
     if Args.name is None:
-        Args.name = f'Margin {ListToCsv(Args.margin)}, gutter {ListToCsv(Args.gutter)}'
-        if Args.ratio is not None:
-            Args.name += f', ratio {Args.ratio}'
-
-    if 1 == len(Args.margin):
-        Args.margin.append(Args.margin[0])
-    if 2 == len(Args.margin):
-        Args.margin.append(Args.margin[0])
-    if 3 == len(Args.margin):
-        Args.margin.append(Args.margin[1])
-    PageMargin = Margin(Args.margin[0], Args.margin[1], Args.margin[2], Args.margin[3])
-
-    if Args.ratio is not None:
-        Width = Book.GetDimensions()[0] - PageMargin.Left - PageMargin.Right
-        Height = Book.GetDimensions()[1] - PageMargin.Top - PageMargin.Bottom
-        if Width / Height < Args.ratio:
-            Diff = Height - Width / Args.ratio
-            PageMargin.Top += Diff / 2
-            PageMargin.Bottom += Diff / 2
-        else:
-            Diff = Width - Height * Args.ratio
-            PageMargin.Left += Diff / 2
-            PageMargin.Right += Diff / 2
-
-    if 1 == len(Args.gutter):
-        Args.gutter.append(Args.gutter[0])
-    ImageGutter = Gutter(Args.gutter[0], Args.gutter[1])
-
-    OutputLayoutFile(Args.outdir, Book, Args.name)
-    OutputTemplateFiles(Args.outdir, Book, Args.name, PageMargin, ImageGutter)
+        Args.name = GetDefaultName(Args.margin, Args.gutter, Args.ratio)
+
+    try:
+        PageMargin = GetPageMargin(Book, Args.margin, Args.ratio)
+    except ValueError as Error:
+        Parser.error(str(Error))
+    ImageGutter = GetImageGutter(Args.gutter)
+
+    Cache = GetPreviewCache(Args.preview_cache, Args.preview_cache_size)
+
+    # Installed files are generated in memory, and only written when they have changed.
+    if Args.install:
+        Out: Union[Path, Output] = MemoryOutput()
+    elif Args.archive is not None:
+        Out = ZipOutput(Args.archive)
+    else:
+        Out = Args.outdir
+    with Profiler(Args.profile or Args.profile_output is not None) as Profile:
+        try:
+            OutputLayoutFile(Out, Book, Args.name, Incremental=Args.incremental or Args.install)
+            OutputTemplateFiles(Out, Book, Args.name, PageMargin, ImageGutter, Cache=Cache, Incremental=Args.incremental, Threads=Args.threads, Profile=Profile, Format=PreviewFormat(Args.compact_previews, Args.compression_level), Renderer=Args.renderer, Previews=not Args.no_previews, StableIds=Args.install, Minified=Args.minify_lua)
+        finally:
+            # The archive is only readable once it is closed, also when the generation failed.
+            if isinstance(Out, ZipOutput):
+                Out.Close()
+        if isinstance(Out, MemoryOutput):
+            with Profile.Stage('install'):
+                Result = InstallFiles(Args.outdir, Out.Files)
+            logging.info(f'Installed {Result.Written} changed files, kept {Result.Unchanged} unchanged files, and removed {Result.Removed} stale files.')
+
+    if Profile.Enabled:
+        Profile.PrintSummary()
+    if Args.profile_output is not None:
+        Profile.Save(Args.profile_output, Args.profile_format)
 
 
 if __name__ == '__main__':
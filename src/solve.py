@@ -0,0 +1,152 @@
+import argparse
+import itertools
+import logging
+import math
+import time
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from BatchGeometry import GetCatalogPlacements, GetParameters, Placements
+from Feasibility import GetImageSizes, GetLayoutStarts
+from generate import BookType, BookTypes, GetImageGutter, GetPageMargin, ListToCsv
+from sweep import ExpandSpecs, ParseRatios
+
+
+# Number of parameter sets evaluated at once, bounding the memory used.
+BatchSize = 4096
+
+# Number of rows compared with each other at once when finding the Pareto front.
+ParetoBlockSize = 1024
+
+
+class Configuration(NamedTuple):
+    Margins: List[int]
+    Gutters: List[int]
+    Ratio: Optional[float]
+
+
+def ParseAspect(Text: str) -> float:
+    """
+    Parse an aspect ratio, either as width:height (`3:2`) or as a number (`1.5`).
+    """
+    try:
+        if ':' in Text:
+            Width, Height = Text.split(':')
+            Aspect = float(Width) / float(Height)
+        else:
+            Aspect = float(Text)
+    except (ValueError, ZeroDivisionError):
+        raise argparse.ArgumentTypeError(f'invalid aspect ratio "{Text}"')
+    if not 0 < Aspect < math.inf:
+        raise argparse.ArgumentTypeError(f'aspect ratio "{Text}" must be positive')
+    return Aspect
+
+
+def EvaluateConfigurations(Book: BookType, Placements: Placements, Configurations: Sequence[Configuration], Aspects: Sequence[float], MinSize: float = 0) -> np.ndarray:
+    """
+    Score parameter sets by how well the images of all layouts fit the target aspect ratios.
+    The result has one row per parameter set, with the mean and worst error of the images, and
+    the negated mean share of the page covered by images, so that all scores are minimized. The
+    error of an image is the distance in log space from its aspect ratio to the closest target.
+    Parameter sets where any image is at most MinSize wide or high, or whose margins leave no room
+    for content, score infinity.
+    """
+    PageMargins = []
+    HasContent = np.ones(len(Configurations), dtype=bool)
+    for Idx, Configuration in enumerate(Configurations):
+        try:
+            PageMargins.append(GetPageMargin(Book, Configuration.Margins, Configuration.Ratio))
+        except ValueError:
+            # The margins without the ratio only keep the parameter sets aligned with the scores.
+            PageMargins.append(GetPageMargin(Book, Configuration.Margins, None))
+            HasContent[Idx] = False
+    Width, Height = GetImageSizes(Placements, *GetParameters([(Book.GetDimensions(), PageMargin, GetImageGutter(Configuration.Gutters)) for Configuration, PageMargin in zip(Configurations, PageMargins)]))
+    Feasible = HasContent & np.all(MinSize < Width, axis=1) & np.all(MinSize < Height, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        LogAspect = np.log(Width / Height)
+    # There are few targets, so taking the minimum target by target is faster than reducing.
+    Errors = np.full(LogAspect.shape, np.inf)
+    for Aspect in Aspects:
+        np.minimum(Errors, np.abs(LogAspect - math.log(Aspect)), out=Errors)
+
+    PageArea = Book.Width * Book.Height * np.where(Placements.IsDoublePage, 2, 1)
+    Coverage = np.add.reduceat(Width * Height / PageArea, GetLayoutStarts(Placements), axis=1).mean(axis=1)
+
+    Scores = np.stack([Errors.mean(axis=1), Errors.max(axis=1), -Coverage], axis=1)
+    Scores[~Feasible] = np.inf
+    return Scores
+
+
+def GetParetoFront(Scores: np.ndarray) -> List[int]:
+    """
+    Get the rows of finite scores that are not dominated by any other row, in lexicographic order
+    of their scores. Of rows with equal scores, only the first is kept.
+    """
+    Order = np.lexsort(Scores.T[::-1])
+    Order = Order[np.all(np.isfinite(Scores[Order]), axis=1)]
+    Front = np.empty((0, Scores.shape[1]))
+    Indices: List[int] = []
+    # A row can only be dominated by rows before it in lexicographic order, and dominance is
+    # transitive, so each block of rows only has to be compared with the front so far, and the
+    # rows that remain with the rows before them that remain.
+    for Start in range(0, len(Order), ParetoBlockSize):
+        Block = Order[Start:Start + ParetoBlockSize]
+        Block = Block[~np.any(np.all(Front[np.newaxis] <= Scores[Block][:, np.newaxis], axis=2), axis=1)]
+        Rows = Scores[Block]
+        Dominated = np.any(np.tril(np.all(Rows[np.newaxis] <= Rows[:, np.newaxis], axis=2), -1), axis=1)
+        Front = np.concatenate([Front, Rows[~Dominated]])
+        Indices.extend(Block[~Dominated].tolist())
+    return Indices
+
+
+def Solve(Book: BookType, Configurations: Sequence[Configuration], Aspects: Sequence[float], MinSize: float = 0) -> List[Tuple[Configuration, np.ndarray]]:
+    """
+    Get the Pareto-best parameter sets for the layout catalog, with their scores as for
+    EvaluateConfigurations, ordered by mean error.
+    """
+    _, Placements = GetCatalogPlacements()
+    Scores = np.concatenate([EvaluateConfigurations(Book, Placements, Configurations[Start:Start + BatchSize], Aspects, MinSize) for Start in range(0, len(Configurations), BatchSize)]) if Configurations else np.empty((0, 3))
+    return [(Configurations[Idx], Scores[Idx]) for Idx in GetParetoFront(Scores)]
+
+
+def FormatError(Error: float) -> str:
+    # Distance in log space, shown as the relative deviation from the target aspect ratio.
+    return f'{math.expm1(Error):.1%}'
+
+
+def main() -> None:
+    Parser = argparse.ArgumentParser(description='Find margins, gutters and ratios that give images close to target aspect ratios.')
+    Parser.add_argument('book', choices=BookTypes.keys(), help='Book to find parameters for.')
+    Parser.add_argument('-a', '--aspect', type=ParseAspect, nargs='+', default=[1.5, 2 / 3], help='Target aspect ratios of images, as width:height (3:2) or numbers (1.5). Default: 3:2 2:3.')
+    Parser.add_argument('-m', '--margin', nargs='+', action='append', help='Margins to search, as for sweep.py. Can be given multiple times. Default: 0:100:5.')
+    Parser.add_argument('-g', '--gutter', nargs='+', action='append', help='Gutters to search, as for sweep.py. Can be given multiple times. Default: 0:40:2.')
+    Parser.add_argument('-r', '--ratio', type=ParseRatios, default=[None], help='Ratios to search, as for sweep.py. Default: none.')
+    Parser.add_argument('--min-image-size', type=float, default=0, help='Only consider parameters where all images are wider and higher than this. Default: 0.')
+    Parser.add_argument('-n', '--count', type=int, default=20, help='Maximum number of parameter sets to print. Default: 20.')
+    Parser.add_argument('-l', '--log', default='info', choices=['debug', 'info', 'warning', 'error', 'critical'], help='Set the logging level.')
+
+    Args = Parser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=Args.log.upper())
+
+    try:
+        Margins = ExpandSpecs(Args.margin or [['0:100:5']], 1, 4, 'margin')
+        Gutters = ExpandSpecs(Args.gutter or [['0:40:2']], 1, 2, 'gutter')
+    except (argparse.ArgumentTypeError, ValueError) as Error:
+        Parser.error(str(Error))
+
+    Book = BookTypes[Args.book]
+    Configurations = [Configuration(*Combination) for Combination in itertools.product(Margins, Gutters, Args.ratio)]
+    Start = time.perf_counter()
+    Results = Solve(Book, Configurations, Args.aspect, Args.min_image_size)
+    logging.info(f'Evaluated {len(Configurations)} parameter sets in {time.perf_counter() - Start:.3f} seconds, {len(Results)} of them Pareto-best.')
+
+    print(f'{"Margin":<16}  {"Gutter":<8}  {"Ratio":<6}  {"Mean error":>10}  {"Worst error":>11}  {"Coverage":>8}')
+    for Result, (MeanError, WorstError, Coverage) in Results[:Args.count]:
+        Ratio = 'none' if Result.Ratio is None else f'{Result.Ratio:g}'
+        print(f'{ListToCsv(Result.Margins):<16}  {ListToCsv(Result.Gutters):<8}  {Ratio:<6}  {FormatError(MeanError):>10}  {FormatError(WorstError):>11}  {-Coverage:>8.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import itertools
+import logging
+import os
+from pathlib import Path
+import time
+from typing import List, Optional, Tuple
+
+from BatchGeometry import GetCatalogPlacements, GetParameters
+from Feasibility import AnalyzeFeasibility
+from generate import BookTypes, DirValidator, GetDefaultName, GetImageGutter, GetPageMargin, GetPreviewCache, ListToCsv, OutputLayoutFile, OutputTemplateFiles
+from PreviewCache import PreviewCache
+
+
+class Job:
+    def __init__(self, Book: str, Margins: List[int], Gutters: List[int], Ratio: Optional[float]) -> None:
+        self.Book = Book
+        self.Margins = Margins
+        self.Gutters = Gutters
+        self.Ratio = Ratio
+        self.Name = GetDefaultName(Margins, Gutters, Ratio)
+
+
+def ParseValues(Text: str, Type: type) -> List:
+    """
+    Parse a sweep value.
+    A value is either a single number (`10`), a comma separated list of numbers (`10,20,40`), or
+    an inclusive range with an optional step (`10:40` or `10:40:5`). The step defaults to 1.
+    """
+    if ':' in Text:
+        Parts = Text.split(':')
+        if len(Parts) not in (2, 3):
+            raise argparse.ArgumentTypeError(f'invalid range "{Text}"')
+        Start = Type(Parts[0])
+        Stop = Type(Parts[1])
+        Step = Type(Parts[2]) if 3 == len(Parts) else Type(1)
+        if Step <= 0:
+            raise argparse.ArgumentTypeError(f'step in range "{Text}" must be positive')
+        Values = []
+        Idx = 0
+        # Multiply instead of accumulating, so that float ranges do not drift.
+        while Start + Idx * Step <= Stop + Step / 1e9:
+            Values.append(Type(round(Start + Idx * Step, 9)))
+            Idx += 1
+        return Values
+    return [Type(Value) for Value in Text.split(',')]
+
+
+def ParseRatios(Text: str) -> List[Optional[float]]:
+    Ratios: List[Optional[float]] = []
+    for Part in Text.split(','):
+        if 'none' == Part.lower():
+            Ratios.append(None)
+        else:
+            Ratios.extend(ParseValues(Part, float))
+    return Ratios
+
+
+def ExpandSpecs(Specs: List[List[str]], Min: int, Max: int, Dest: str) -> List[List[int]]:
+    Combinations = []
+    for Spec in Specs:
+        if not Min <= len(Spec) <= Max:
+            raise argparse.ArgumentTypeError(f'argument "{Dest}" requires between {Min} and {Max} arguments')
+        for Combination in itertools.product(*(ParseValues(Value, int) for Value in Spec)):
+            if list(Combination) not in Combinations:
+                Combinations.append(list(Combination))
+    return Combinations
+
+
+def GetJobs(Books: List[str], Margins: List[List[int]], Gutters: List[List[int]], Ratios: List[Optional[float]]) -> List[Job]:
+    return [Job(Book, Margin, Gutter, Ratio) for Book, Margin, Gutter, Ratio in itertools.product(Books, Margins, Gutters, Ratios)]
+
+
+def FindInfeasibleLayouts(Jobs: List[Job], MinSize: float = 0) -> List[List[str]]:
+    """
+    Get the layouts that have images of at most MinSize in width or height, for each job.
+    All jobs are analyzed at once, before any of them are generated.
+    """
+    Uuids, Placements = GetCatalogPlacements()
+    # Jobs whose margins leave no room for content cannot fit any layout.
+    Infeasible = [list(Uuids) for _ in Jobs]
+    Analyzed = []
+    Configurations = []
+    for JobIdx, Job in enumerate(Jobs):
+        Book = BookTypes[Job.Book]
+        try:
+            PageMargin = GetPageMargin(Book, Job.Margins, Job.Ratio)
+        except ValueError:
+            continue
+        Analyzed.append(JobIdx)
+        Configurations.append((Book.GetDimensions(), PageMargin, GetImageGutter(Job.Gutters)))
+    if Configurations:
+        Feasible = AnalyzeFeasibility(Placements, *GetParameters(Configurations)).IsFeasible(MinSize)
+        for JobIdx, Row in zip(Analyzed, Feasible.tolist()):
+            Infeasible[JobIdx] = [Uuid for Uuid, IsFeasible in zip(Uuids, Row) if not IsFeasible]
+    return Infeasible
+
+
+def RunJob(OutDir: Path, Job: Job, Cache: Optional[PreviewCache], Incremental: bool, Threads: int) -> float:
+    Start = time.perf_counter()
+    Book = BookTypes[Job.Book]
+    OutputLayoutFile(OutDir, Book, Job.Name, Incremental=Incremental)
+    OutputTemplateFiles(OutDir, Book, Job.Name, GetPageMargin(Book, Job.Margins, Job.Ratio), GetImageGutter(Job.Gutters), Cache=Cache, Incremental=Incremental, Threads=Threads)
+    return time.perf_counter() - Start
+
+
+def PrintTimings(Timings: List[Tuple[Job, float]], WallTime: float) -> None:
+    BookWidth = max([len('Book')] + [len(Job.Book) for Job, _ in Timings])
+    NameWidth = max([len('Name')] + [len(Job.Name) for Job, _ in Timings])
+    print(f'{"Book":<{BookWidth}}  {"Name":<{NameWidth}}  {"Seconds":>8}')
+    for Job, Seconds in Timings:
+        print(f'{Job.Book:<{BookWidth}}  {Job.Name:<{NameWidth}}  {Seconds:>8.3f}')
+    print(f'{len(Timings)} jobs in {WallTime:.3f} seconds ({sum(Seconds for _, Seconds in Timings):.3f} seconds of work).')
+
+
+def main() -> None:
+    Parser = argparse.ArgumentParser(description='Generate layout templates for many combinations of book types, margins, gutters and ratios.')
+    Parser.add_argument('book', nargs='*', help=f'Books to generate layout templates for, from {{{ListToCsv(list(BookTypes.keys()))}}}. Default: all book types.')
+    Parser.add_argument('-o', '--outdir', type=Path, default=os.getcwd(), action=DirValidator, help='Output directory for the template files. Default: current working directory.')
+    Parser.add_argument('-m', '--margin', nargs='+', action='append', help='Margin on pages, as for generate.py. Each number can be a list (10,20) or an inclusive range (10:40:10). Can be given multiple times.')
+    Parser.add_argument('-g', '--gutter', nargs='+', action='append', help='Gutter between images, as for generate.py. Each number can be a list (5,10) or an inclusive range (0:20:5). Can be given multiple times.')
+    Parser.add_argument('-r', '--ratio', type=ParseRatios, default=[None], help='Desired ratios between width and height of content on page, as a list (1,1.5,none) or an inclusive range (1:2:0.25). Default: none.')
+    Parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of worker processes. Default: number of CPUs.')
+    Parser.add_argument('--preview-cache', type=Path, help='Directory for caching preview thumbnails between runs. Default: no caching.')
+    Parser.add_argument('--preview-cache-size', type=int, default=64, help='Maximum size of the preview cache in megabytes. Default: 64.')
+    Parser.add_argument('-t', '--threads', type=int, default=0, help='Number of threads per worker process for encoding and writing preview thumbnails. Default: 0, writing them on the main thread of each worker.')
+    Parser.add_argument('-i', '--incremental', action='store_true', help='Only regenerate layout templates whose inputs have changed since the last run, and use deterministic IDs.')
+    Parser.add_argument('--min-image-size', type=float, default=0, help='Skip combinations where any layout has images of at most this width or height. Default: 0.')
+    Parser.add_argument('-f', '--force', action='store_true', help='Generate combinations where layouts have too small images anyway, with a warning.')
+    Parser.add_argument('-l', '--log', default='info', choices=['debug', 'info', 'warning', 'error', 'critical'], help='Set the logging level.')
+
+    Args = Parser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=Args.log.upper())
+
+    for Book in Args.book:
+        if Book not in BookTypes:
+            Parser.error(f'argument book: invalid choice: \'{Book}\'')
+
+    try:
+        Margins = ExpandSpecs(Args.margin or [['0']], 1, 4, 'margin')
+        Gutters = ExpandSpecs(Args.gutter or [['0']], 1, 2, 'gutter')
+    except (argparse.ArgumentTypeError, ValueError) as Error:
+        Parser.error(str(Error))
+
+    Jobs = GetJobs(Args.book or list(BookTypes.keys()), Margins, Gutters, Args.ratio)
+    FeasibleJobs = []
+    for Job, Layouts in zip(Jobs, FindInfeasibleLayouts(Jobs, Args.min_image_size)):
+        if not Layouts:
+            FeasibleJobs.append(Job)
+            continue
+        Message = f'"{Job.Name}" for "{Job.Book}" has {len(Layouts)} layouts with images of at most {Args.min_image_size:g} points, like {Layouts[0]}.'
+        if Args.force:
+            logging.warning(Message)
+            FeasibleJobs.append(Job)
+        else:
+            logging.error(f'{Message} Skipping it.')
+    Jobs = FeasibleJobs
+    logging.info(f'Generating {len(Jobs)} layout template collections using {Args.jobs} workers.')
+
+    Cache = GetPreviewCache(Args.preview_cache, Args.preview_cache_size)
+
+    Start = time.perf_counter()
+    Timings = []
+    with ProcessPoolExecutor(max_workers=Args.jobs) as Executor:
+        Futures = {Executor.submit(RunJob, Args.outdir, Job, Cache, Args.incremental, Args.threads): JobIdx for JobIdx, Job in enumerate(Jobs)}
+        for Future in as_completed(Futures):
+            JobIdx = Futures[Future]
+            Job = Jobs[JobIdx]
+            try:
+                Timings.append((JobIdx, Job, Future.result()))
+            except Exception:
+                logging.exception(f'Failed to generate "{Job.Name}" for "{Job.Book}".')
+    WallTime = time.perf_counter() - Start
+
+    Timings.sort(key=lambda Timing: Timing[0])
+    PrintTimings([(Job, Seconds) for _, Job, Seconds in Timings], WallTime)
+
+
+if __name__ == '__main__':
+    main()
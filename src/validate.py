@@ -0,0 +1,39 @@
+import argparse
+import logging
+import sys
+import time
+
+import Layout
+from Validation import ValidateCatalog
+
+
+def main() -> None:
+    Parser = argparse.ArgumentParser(description='Check the layout catalog for overlapping images, uncovered cells and duplicate layouts.')
+    Parser.add_argument('-s', '--strict', action='store_true', help='Treat uncovered cells and mirror images of other layouts as errors.')
+    Parser.add_argument('-l', '--log', default='info', choices=['debug', 'info', 'warning', 'error', 'critical'], help='Set the logging level.')
+
+    Args = Parser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=Args.log.upper())
+
+    Start = time.perf_counter()
+    Catalog = Layout.GetCatalog()
+    Issues = ValidateCatalog(Catalog)
+    logging.debug(f'Validated {len(Catalog)} layouts in {(time.perf_counter() - Start) * 1000:.1f} ms.')
+
+    Errors = 0
+    for Issue in Issues:
+        if Issue.IsError() or Args.strict:
+            Errors += 1
+            logging.error(f'{Issue.Uuid}: {Issue.Message}')
+        elif 'gap' == Issue.Kind:
+            logging.warning(f'{Issue.Uuid}: {Issue.Message}')
+        else:
+            logging.info(f'{Issue.Uuid}: {Issue.Message}')
+
+    logging.info(f'{len(Catalog)} layouts, {Errors} errors.')
+    sys.exit(1 if Errors else 0)
+
+
+if __name__ == '__main__':
+    main()